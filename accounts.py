@@ -0,0 +1,103 @@
+import json
+import os
+import re
+from dataclasses import dataclass, field, replace
+from typing import Any
+
+import exceptions
+
+
+ACCOUNT_NAME_PATTERN = re.compile(r'^[\w.-]+$')
+
+
+@dataclass(frozen=True)
+class Account:
+    """Practicum account whose homeworks are tracked by the bot."""
+
+    name: str
+    practicum_token: str
+    chat_id: str
+    subscribers: tuple = ()
+
+    @property
+    def chats(self):
+        """Returns the account's own chat and its subscribed chats."""
+        return tuple(dict.fromkeys((self.chat_id, *self.subscribers)))
+
+
+@dataclass
+class AccountState:
+    """Polling state the bot keeps for an account between cycles."""
+
+    account: Account
+    session: Any
+    snapshot: dict
+    timestamp: int
+    scheduler: Any
+    hot: dict = field(default_factory=dict)
+    due: float = 0
+    failures: int = 0
+
+
+def load_accounts(path):
+    """Loads the accounts registry from a JSON file."""
+    try:
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        accounts = [
+            Account(
+                item['name'], item['practicum_token'], str(item['chat_id'])
+            )
+            for item in data
+        ]
+    except (OSError, ValueError, KeyError, TypeError) as error:
+        raise exceptions.ConfigException(
+            f'Invalid accounts file {path}: {error}'
+        )
+    names = set()
+    for account in accounts:
+        if not ACCOUNT_NAME_PATTERN.match(account.name):
+            raise exceptions.ConfigException(
+                f'Invalid account name: {account.name}'
+            )
+        if account.name in names:
+            raise exceptions.ConfigException(
+                f'Duplicate account name: {account.name}'
+            )
+        names.add(account.name)
+    return accounts
+
+
+def load_subscriptions(path):
+    """Loads the {account name: [chat id, ...]} map from a JSON file.
+
+    A missing file means that no account has extra subscribers.
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+        subscriptions = {}
+        for name, chat_ids in data.items():
+            if not isinstance(chat_ids, list):
+                raise TypeError(f'chats of {name} are not a list')
+            subscriptions[name] = tuple(str(chat_id) for chat_id in chat_ids)
+    except (OSError, ValueError, AttributeError, TypeError) as error:
+        raise exceptions.ConfigException(
+            f'Invalid subscriptions file {path}: {error}'
+        )
+    return subscriptions
+
+
+def subscribe(accounts, subscriptions):
+    """Returns the accounts with their subscribed chats."""
+    unknown = set(subscriptions) - {account.name for account in accounts}
+    if unknown:
+        raise exceptions.ConfigException(
+            f'Subscriptions for unknown accounts: {", ".join(sorted(unknown))}'
+        )
+    return [
+        replace(account, subscribers=subscriptions.get(account.name, ()))
+        for account in accounts
+    ]
@@ -0,0 +1,106 @@
+"""Memory taken by tracked homeworks as raw dicts and as records.
+
+Usage: python benchmarks/memory.py [COUNT]
+"""
+import gc
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import homework  # noqa: E402
+
+COUNT = 100_000
+PER_ACCOUNT = 50
+
+
+def resident_kib():
+    """Returns the resident set size of the process in KiB."""
+    with open('/proc/self/statm') as file:
+        pages = int(file.read().split()[1])
+    return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def make_body(start, count):
+    """Returns an API response body with the given number of homeworks."""
+    statuses = list(homework.HOMEWORK_VERDICTS)
+    return json.dumps({
+        'homeworks': [
+            {
+                'id': number,
+                'homework_name': f'student{number}__project{number % 40}.zip',
+                'status': statuses[number % len(statuses)],
+                'date_updated': '2020-02-13T14:40:57Z',
+                'lesson_name': f'Project {number % 40}',
+                'reviewer_comment': '',
+            }
+            for number in range(start, start + count)
+        ],
+        'current_date': 1581604970,
+    }).encode()
+
+
+VARIANTS = {
+    'dicts': lambda items: items,
+    'records': lambda items: homework.HOMEWORK_VALIDATOR.validate(items)[0],
+}
+
+
+def track(build, bodies):
+    """Decodes one response per account and keeps what build returns."""
+    return [
+        build(homework.DECODER.decode(body)['homeworks']) for body in bodies
+    ]
+
+
+def measure(variant, count):
+    """Returns the resident KiB and traced bytes kept by the variant."""
+    build = VARIANTS[variant]
+    bodies = [
+        make_body(start, min(PER_ACCOUNT, count - start))
+        for start in range(0, count, PER_ACCOUNT)
+    ]
+    gc.collect()
+    rss = resident_kib()
+    tracked = track(build, bodies)
+    gc.collect()
+    rss = resident_kib() - rss
+    del tracked
+    gc.collect()
+    tracemalloc.start()
+    tracked = track(build, bodies)
+    gc.collect()
+    traced = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del tracked
+    return rss, traced
+
+
+def main():
+    """Prints the memory of both variants, each in a fresh interpreter."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else COUNT
+    if len(sys.argv) > 2:
+        print(*measure(sys.argv[2], count))
+        return
+    print(
+        f'{count} tracked homeworks, {PER_ACCOUNT} per account, '
+        f'{homework.DECODER.backend} decoder'
+    )
+    for variant in VARIANTS:
+        output = subprocess.run(
+            [sys.executable, __file__, str(count), variant],
+            capture_output=True, check=True, text=True
+        ).stdout
+        rss, traced = map(int, output.split())
+        print(
+            f'{variant:>8}: RSS +{rss / 1024:6.1f} MiB, '
+            f'{traced / 2 ** 20:6.1f} MiB traced, '
+            f'{traced / count:5.0f} B per homework'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,257 @@
+"""Local stand-ins for the Practicum API and the Telegram Bot API.
+
+Both servers run on 127.0.0.1, answer after a configurable latency and
+fail a configurable share of requests, so the bot can be benchmarked on
+a laptop without network access. StubProcess runs a server in a child
+process so it does not compete with the bot for the GIL.
+"""
+import json
+import multiprocessing
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+STATUSES = ('reviewing', 'rejected')
+
+
+class Server(ThreadingHTTPServer):
+    """Threaded HTTP server with a backlog fit for many clients."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class StubServer:
+    """Threaded HTTP server with latency and error injection."""
+
+    def __init__(self, handler, latency=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.server = Server(('127.0.0.1', 0), handler)
+        self.server.stub = self
+
+    @property
+    def url(self):
+        """Returns the base URL of the server."""
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serves requests from a daemon thread."""
+        threading.Thread(
+            target=self.server.serve_forever, name='stub', daemon=True
+        ).start()
+        return self
+
+    def stop(self):
+        """Stops the server and closes its socket."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def report(self):
+        """Returns the request counters."""
+        with self.lock:
+            return {'requests': self.requests, 'errors': self.errors}
+
+    def admit(self):
+        """Waits out the latency and decides if the request fails."""
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.requests += 1
+            failed = self.random.random() < self.error_rate
+            self.errors += failed
+        return not failed
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Keep-alive request handler writing JSON answers."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def answer(self, status, payload=None, headers=()):
+        """Sends the JSON payload with the status and headers."""
+        body = b'' if payload is None else json.dumps(payload).encode()
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Keeps the benchmark output clean."""
+
+
+class PracticumHandler(StubHandler):
+    """Answers homework_statuses requests of the Practicum stub."""
+
+    def do_GET(self):
+        """Returns the homeworks of the account the token belongs to."""
+        stub = self.server.stub
+        if not stub.admit():
+            self.answer(500, {'code': 'server_error'})
+            return
+        token = self.headers.get('Authorization', '').split()[-1]
+        query = parse_qs(urlsplit(self.path).query)
+        if 'from_date' not in query:
+            self.answer(400, {'code': 'UnknownError'})
+            return
+        etag, body = stub.poll(token)
+        if self.headers.get('If-None-Match') == etag:
+            self.answer(304, headers=(('ETag', etag),))
+            return
+        self.answer(200, body, headers=(('ETag', etag),))
+
+
+class PracticumStub(StubServer):
+    """homework_statuses endpoint with homeworks that change over time.
+
+    Every account has the same number of homeworks; each request changes
+    the status of one of them with the given probability. The time each
+    change is first served is kept so the notification latency can be
+    measured when the message reaches the Telegram stub.
+    """
+
+    def __init__(self, homeworks=10, change_rate=0.1, **kwargs):
+        super().__init__(PracticumHandler, **kwargs)
+        self.homeworks = homeworks
+        self.change_rate = change_rate
+        self.accounts = {}
+        self.changes = {}
+
+    PATH = '/api/user_api/homework_statuses/'
+
+    def report(self):
+        """Returns the counters and the time of the last change by name."""
+        report = super().report()
+        with self.lock:
+            report['changes'] = dict(self.changes)
+        return report
+
+    def account(self, token):
+        """Returns the state of the account, creating it on first use."""
+        state = self.accounts.get(token)
+        if state is None:
+            state = self.accounts[token] = {
+                'version': 0,
+                'updated': int(time.time()),
+                'statuses': [STATUSES[0]] * self.homeworks,
+            }
+        return state
+
+    def poll(self, token):
+        """Returns the ETag and the body of the account's homeworks."""
+        with self.lock:
+            state = self.account(token)
+            if self.homeworks and self.random.random() < self.change_rate:
+                number = self.random.randrange(self.homeworks)
+                status = STATUSES[
+                    (STATUSES.index(state['statuses'][number]) + 1)
+                    % len(STATUSES)
+                ]
+                state['statuses'][number] = status
+                state['version'] += 1
+                state['updated'] = int(time.time())
+                self.changes[f'{token}-{number}'] = time.monotonic()
+            homeworks = [
+                {
+                    'id': number,
+                    'homework_name': f'{token}-{number}',
+                    'status': status,
+                    'reviewer_comment': '',
+                    'date_updated': f'{state["version"]}',
+                    'lesson_name': f'Project {number}',
+                }
+                for number, status in enumerate(state['statuses'])
+            ]
+            etag = f'"{token}-{state["version"]}"'
+            return etag, {
+                'homeworks': homeworks, 'current_date': state['updated']
+            }
+
+
+class TelegramHandler(StubHandler):
+    """Answers sendMessage calls of the Telegram stub."""
+
+    def do_POST(self):
+        """Records the message and answers like the Bot API."""
+        stub = self.server.stub
+        length = int(self.headers.get('Content-Length', 0))
+        data = json.loads(self.rfile.read(length) or b'{}')
+        if not self.path.endswith('/sendMessage'):
+            self.answer(404, {'ok': False, 'error_code': 404})
+            return
+        if not stub.admit():
+            self.answer(
+                500, {'ok': False, 'error_code': 500,
+                      'description': 'Internal Server Error'}
+            )
+            return
+        message_id = stub.deliver(data['chat_id'], data['text'])
+        self.answer(200, {'ok': True, 'result': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(data['chat_id']), 'type': 'private'},
+            'text': data['text'],
+        }})
+
+
+class TelegramStub(StubServer):
+    """Bot API stand-in keeping the messages it receives."""
+
+    PATH = '/bot'
+    TOKEN = '123456:stub'
+
+    def __init__(self, **kwargs):
+        super().__init__(TelegramHandler, **kwargs)
+        self.messages = []
+
+    def report(self):
+        """Returns the counters and the (arrived, chat_id, text) messages."""
+        report = super().report()
+        with self.lock:
+            report['messages'] = list(self.messages)
+        return report
+
+    def deliver(self, chat_id, text):
+        """Keeps the message with the time it arrived."""
+        with self.lock:
+            self.messages.append((time.monotonic(), chat_id, text))
+            return len(self.messages)
+
+
+def serve(connection, factory, options):
+    """Runs the stub until the parent asks for its report."""
+    stub = factory(**options).start()
+    connection.send(stub.url)
+    connection.recv()
+    stub.stop()
+    connection.send(stub.report())
+
+
+class StubProcess:
+    """Stub server running in a child process."""
+
+    def __init__(self, factory, **options):
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=serve, args=(child, factory, options), daemon=True
+        )
+        self.process.start()
+        child.close()
+        self.url = self.connection.recv() + factory.PATH
+
+    def stop(self):
+        """Stops the server and returns its report."""
+        self.connection.send('stop')
+        report = self.connection.recv()
+        self.process.join()
+        return report
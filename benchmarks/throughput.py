@@ -0,0 +1,170 @@
+"""Throughput of the polling engine against local stand-in servers.
+
+Usage: python benchmarks/throughput.py [--accounts N] [--duration S] ...
+
+Runs the async engine for the given time against the Practicum and
+Telegram stubs and reports polled accounts per second, p50/p99 latency
+from a status change being served to its message reaching Telegram,
+and the peak resident memory.
+"""
+import argparse
+import asyncio
+import os
+import re
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import telegram  # noqa: E402
+from telegram.utils.request import Request  # noqa: E402
+
+import homework  # noqa: E402
+import sender as sender_module  # noqa: E402
+from accounts import Account  # noqa: E402
+from benchmarks.stubs import (  # noqa: E402
+    PracticumStub, StubProcess, TelegramStub
+)
+from engine import AsyncEngine  # noqa: E402
+from scheduler import AdaptiveScheduler  # noqa: E402
+from sender import MessageSender  # noqa: E402
+from storage import Outbox, StatusStore  # noqa: E402
+
+HOMEWORK_NAME = re.compile(r'"([^"]+-\d+)"')
+
+
+def percentile(values, share):
+    """Returns the value below which the share of the values falls."""
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(share * len(values)))]
+
+
+def latencies(changes, messages):
+    """Returns the seconds from each change to its message."""
+    result = []
+    for arrived, _, text in messages:
+        for name in HOMEWORK_NAME.findall(text):
+            changed = changes.get(name)
+            if changed is not None and changed <= arrived:
+                result.append(arrived - changed)
+    return result
+
+
+async def run_engine(engine, duration):
+    """Runs the engine for the given number of seconds."""
+    try:
+        await asyncio.wait_for(engine.run_forever(), duration)
+    except asyncio.TimeoutError:
+        pass
+
+
+def run(accounts=100, homeworks=10, duration=10.0, interval=0.0,
+        concurrency=50, change_rate=0.05, api_latency=0.02, api_errors=0.0,
+        telegram_latency=0.01, telegram_errors=0.0, seed=1):
+    """Runs the benchmark and returns its results."""
+    practicum = StubProcess(
+        PracticumStub, homeworks=homeworks, change_rate=change_rate,
+        latency=api_latency, error_rate=api_errors, seed=seed
+    )
+    telegram_stub = StubProcess(
+        TelegramStub, latency=telegram_latency, error_rate=telegram_errors,
+        seed=seed
+    )
+    endpoint, replay = homework.ENDPOINT, sender_module.REPLAY_INTERVAL
+    homework.ENDPOINT = practicum.url
+    sender_module.REPLAY_INTERVAL = 1
+    cwd = os.getcwd()
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            os.makedirs(homework.CURSOR_DIR)
+            store = StatusStore('homework.db')
+            names = [f'account{number}' for number in range(accounts)]
+            for name in names:
+                for number in range(homeworks):
+                    store.set_status(name, number, 'reviewing')
+            bot = telegram.Bot(
+                TelegramStub.TOKEN, base_url=telegram_stub.url,
+                request=Request(con_pool_size=sender_module.SEND_WORKERS)
+            )
+            sender = MessageSender(
+                bot, Outbox('homework.db'), global_rate=10 ** 6,
+                chat_rate=10 ** 6
+            ).start()
+            engine = AsyncEngine(
+                sender,
+                [Account(name, name, str(index))
+                 for index, name in enumerate(names)],
+                store, concurrency=concurrency
+            )
+            for state in engine.states.values():
+                state.scheduler = AdaptiveScheduler(
+                    interval, min_interval=interval, max_interval=interval,
+                    jitter=0
+                )
+            started = time.monotonic()
+            asyncio.run(run_engine(engine, duration))
+            engine.executor.shutdown(wait=True)
+            elapsed = time.monotonic() - started
+            sender.stop(timeout=30)
+            store.close()
+    finally:
+        os.chdir(cwd)
+        homework.ENDPOINT = endpoint
+        sender_module.REPLAY_INTERVAL = replay
+        api = practicum.stop()
+        bot_api = telegram_stub.stop()
+    delays = latencies(api['changes'], bot_api['messages'])
+    return {
+        'accounts': accounts,
+        'seconds': elapsed,
+        'polls': api['requests'],
+        'accounts_per_second': api['requests'] / elapsed,
+        'api_errors': api['errors'],
+        'changes': len(api['changes']),
+        'messages': len(bot_api['messages']),
+        'p50': percentile(delays, 0.5),
+        'p99': percentile(delays, 0.99),
+        'max_rss_mib': resource.getrusage(
+            resource.RUSAGE_SELF
+        ).ru_maxrss / 1024,
+    }
+
+
+def main():
+    """Parses the options, runs the benchmark and prints the report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--accounts', type=int, default=100)
+    parser.add_argument('--homeworks', type=int, default=10,
+                        help='homeworks in every response')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--interval', type=float, default=0.0,
+                        help='seconds between polls of an account')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--change-rate', type=float, default=0.05,
+                        help='chance a poll changes a status')
+    parser.add_argument('--api-latency', type=float, default=0.02)
+    parser.add_argument('--api-errors', type=float, default=0.0)
+    parser.add_argument('--telegram-latency', type=float, default=0.01)
+    parser.add_argument('--telegram-errors', type=float, default=0.0)
+    options = parser.parse_args()
+    results = run(**vars(options))
+    print(
+        f'{results["accounts"]} accounts, {results["polls"]} polls '
+        f'in {results["seconds"]:.1f}s: '
+        f'{results["accounts_per_second"]:.1f} accounts/s\n'
+        f'{results["changes"]} status changes, '
+        f'{results["messages"]} messages, '
+        f'{results["api_errors"]} API errors\n'
+        f'notification latency p50 {results["p50"] * 1000:.1f} ms, '
+        f'p99 {results["p99"] * 1000:.1f} ms\n'
+        f'peak RSS {results["max_rss_mib"]:.1f} MiB'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import requests
+
+from decoder import Decoder
+
+
+class ApiSession(requests.Session):
+    """Keep-alive API session with conditional requests and traffic stats.
+
+    The session remembers the ETag and Last-Modified validators of the
+    last successful response together with its query parameters, and
+    sends them back when the same query is repeated, so an unchanged
+    response costs a bodiless 304. It also counts the bytes received
+    over the wire and after decompression, and the time its decoder
+    spends parsing them.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.headers['Accept-Encoding'] = 'gzip'
+        self.validated_params = None
+        self.validators = {}
+        self.requests_sent = 0
+        self.not_modified = 0
+        self.bytes_received = 0
+        self.bytes_decoded = 0
+        self.decoder = Decoder()
+
+    def conditional_headers(self, params):
+        """Returns the request headers with validators for the query."""
+        if params != self.validated_params:
+            return self.headers
+        return {**self.headers, **self.validators}
+
+    def remember(self, params, response):
+        """Saves the validators of a successful response."""
+        validators = {}
+        etag = response.headers.get('ETag')
+        if etag:
+            validators['If-None-Match'] = etag
+        last_modified = response.headers.get('Last-Modified')
+        if last_modified:
+            validators['If-Modified-Since'] = last_modified
+        self.validated_params = dict(params) if validators else None
+        self.validators = validators
+
+    def count(self, response):
+        """Adds the response to the traffic counters."""
+        self.requests_sent += 1
+        if response.status_code == requests.codes.not_modified:
+            self.not_modified += 1
+        content = response.content
+        if response.raw is not None:
+            self.bytes_received += response.raw.tell()
+        else:
+            self.bytes_received += len(content)
+        self.bytes_decoded += len(content)
+
+    def stats(self):
+        """Returns the traffic counters."""
+        return {
+            'requests': self.requests_sent,
+            'not_modified': self.not_modified,
+            'bytes_received': self.bytes_received,
+            'bytes_decoded': self.bytes_decoded,
+            **self.decoder.stats(),
+        }
@@ -0,0 +1,223 @@
+"""Telegram commands answered from a cached view of the homeworks.
+
+With COMMANDS=1 the bot long-polls getUpdates and answers /status,
+/history and /debug in the chats of the tracked accounts, including the
+subscribed ones; a chat following several accounts gets an answer for
+each of them. The answers come from the last full API answer of the
+account, kept for CACHE_TTL seconds; concurrent commands for an account
+share one API request.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import telegram
+
+import homework
+from metrics import COMMAND_CACHE, COMMANDS_HANDLED
+from tracing import TRACER
+
+
+COMMANDS_ENABLED = os.getenv('COMMANDS', '') == '1'
+CACHE_TTL = float(os.getenv('CACHE_TTL', 60))
+LONG_POLL_TIMEOUT = int(os.getenv('LONG_POLL_TIMEOUT', 30))
+COMMAND_WORKERS = int(os.getenv('COMMAND_WORKERS', 4))
+HISTORY_SIZE = int(os.getenv('HISTORY_SIZE', 10))
+UPDATES_RETRY = 5
+
+
+class StatusCache:
+    """TTL cache whose misses for the same key share a single load.
+
+    The first caller of an expired key runs the loader, passing it the
+    stale value; callers arriving while it runs wait for its result
+    instead of loading the key again.
+    """
+
+    def __init__(self, loader, ttl=CACHE_TTL, clock=time.monotonic):
+        self.loader = loader
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = {}
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the cached value, loading it once if it is missing."""
+        with self.lock:
+            expires, value = self.entries.get(key, (0, None))
+            if expires > self.clock():
+                COMMAND_CACHE.inc('hit')
+                return value
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Future()
+        if not leader:
+            COMMAND_CACHE.inc('coalesced')
+            return flight.result()
+        COMMAND_CACHE.inc('miss')
+        try:
+            value = self.loader(key, value)
+        except BaseException as error:
+            flight.set_exception(error)
+            raise
+        else:
+            flight.set_result(value)
+            with self.lock:
+                self.entries[key] = (self.clock() + self.ttl, value)
+            return value
+        finally:
+            with self.lock:
+                del self.flights[key]
+
+
+class HomeworkView:
+    """Loads the full homework list of an account for the commands.
+
+    Every account gets its own session, so a repeated request is sent
+    as a conditional one and a 304 keeps the previous list.
+    """
+
+    def __init__(self, accounts):
+        self.accounts = {account.name: account for account in accounts}
+        self.sessions = {}
+        self.cache = StatusCache(self.load)
+
+    def load(self, name, previous):
+        """Returns the validated homeworks from a from_date=0 request."""
+        session = self.sessions.get(name)
+        if session is None:
+            session = self.sessions[name] = homework.create_session(
+                self.accounts[name].practicum_token
+            )
+        response = homework.get_api_answer(0, session)
+        if response is None and previous is not None:
+            return previous
+        homeworks, _ = homework.HOMEWORK_VALIDATOR.validate(
+            homework.check_response(response)
+        )
+        return sorted(
+            homeworks, key=lambda item: str(item.date_updated or ''),
+            reverse=True
+        )
+
+    def homeworks(self, name):
+        """Returns the homeworks of the account, newest first."""
+        return self.cache.get(name)
+
+
+def format_status(homeworks):
+    """Returns the /status answer for the homeworks."""
+    if not homeworks:
+        return 'There are no homeworks yet.'
+    latest = homeworks[0]
+    return (
+        f'The work "{latest.name}": '
+        f'{homework.VERDICTS[latest.code]}'
+    )
+
+
+def format_history(homeworks, size=HISTORY_SIZE):
+    """Returns the /history answer for the homeworks."""
+    if not homeworks:
+        return 'There are no homeworks yet.'
+    return '\n'.join(
+        f'{item.name}: {item.status}' for item in homeworks[:size]
+    )
+
+
+class CommandPoller:
+    """Answers commands received through getUpdates long polling.
+
+    Commands are handled in a thread pool so a slow API request for one
+    chat does not hold up the others; the answers go through the
+    sender like the status messages.
+    """
+
+    def __init__(self, bot, sender, accounts, admin_chat_id=None,
+                 timeout=LONG_POLL_TIMEOUT, workers=COMMAND_WORKERS):
+        self.bot = bot
+        self.sender = sender
+        self.view = HomeworkView(accounts)
+        self.chats = {}
+        for account in accounts:
+            for chat_id in account.chats:
+                self.chats.setdefault(str(chat_id), []).append(account)
+        self.admin_chat_id = admin_chat_id
+        self.timeout = timeout
+        self.offset = None
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name='commands', daemon=True
+        )
+
+    def start(self):
+        """Starts polling for updates."""
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stops polling after the current long poll returns."""
+        self.stopped.set()
+        self.thread.join(timeout)
+        self.executor.shutdown(wait=True)
+
+    def run(self):
+        """Fetches updates until stopped."""
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+            except telegram.error.TelegramError as error:
+                logging.error(f'Error while getting updates: {error}')
+                self.stopped.wait(UPDATES_RETRY)
+
+    def poll(self):
+        """Fetches one batch of updates and dispatches the commands."""
+        updates = self.bot.get_updates(
+            offset=self.offset, timeout=self.timeout
+        )
+        for update in updates:
+            self.offset = update.update_id + 1
+            message = update.message
+            if message is not None and message.text:
+                self.executor.submit(
+                    self.handle, str(message.chat_id), message.text
+                )
+
+    def handle(self, chat_id, text):
+        """Answers the command in the chat."""
+        words = text.split()
+        if not words:
+            return
+        command = words[0].split('@')[0].lower()
+        try:
+            answer = self.answer(chat_id, command)
+        except Exception as error:
+            logging.error(f'Error while answering {command}: {error}')
+            answer = 'The homework statuses are unavailable, try later.'
+        if answer is not None:
+            COMMANDS_HANDLED.inc(command)
+            self.sender.send_message(chat_id, answer)
+
+    def answer(self, chat_id, command):
+        """Returns the answer to the command or None to ignore it."""
+        if command == '/debug':
+            if chat_id != str(self.admin_chat_id):
+                return None
+            return TRACER.report()
+        if command not in ('/status', '/history'):
+            return None
+        accounts = self.chats.get(chat_id)
+        if not accounts:
+            return 'This chat does not follow any account.'
+        answer = format_status if command == '/status' else format_history
+        if len(accounts) == 1:
+            return answer(self.view.homeworks(accounts[0].name))
+        return '\n\n'.join(
+            f'{account.name}:\n{answer(self.view.homeworks(account.name))}'
+            for account in accounts
+        )
@@ -0,0 +1,26 @@
+import os
+import tempfile
+
+
+def load_cursor(path, default):
+    """Reads the saved polling cursor or returns the default one."""
+    try:
+        with open(path, encoding='utf-8') as file:
+            return int(file.read().strip())
+    except (OSError, ValueError):
+        return default
+
+
+def save_cursor(path, timestamp):
+    """Atomically writes the polling cursor to disk."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.cursor-')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(str(int(timestamp)))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
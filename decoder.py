@@ -0,0 +1,57 @@
+import json
+import os
+import time
+
+import exceptions
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+BACKENDS = {'json': json.loads}
+if orjson is not None:
+    BACKENDS['orjson'] = orjson.loads
+JSON_BACKEND = os.getenv(
+    'JSON_BACKEND', 'orjson' if orjson is not None else 'json'
+)
+
+
+class Decoder:
+    """JSON decoder that keeps track of the time spent decoding.
+
+    The backend is orjson when it is installed and the standard json
+    module otherwise; JSON_BACKEND picks one explicitly.
+    """
+
+    def __init__(self, backend=JSON_BACKEND):
+        if backend not in BACKENDS:
+            raise exceptions.ConfigException(
+                f'Unknown JSON backend: {backend}'
+            )
+        self.backend = backend
+        self.loads = BACKENDS[backend]
+        self.decoded = 0
+        self.seconds = 0.0
+
+    def decode(self, content):
+        """Decodes the JSON document from bytes or text."""
+        started = time.perf_counter()
+        try:
+            return self.loads(content)
+        except ValueError as error:
+            raise exceptions.DecodeException(
+                f'The server returned invalid json: {error}'
+            ) from error
+        finally:
+            self.decoded += 1
+            self.seconds += time.perf_counter() - started
+
+    def stats(self):
+        """Returns the decoding counters."""
+        return {
+            'backend': self.backend,
+            'decoded': self.decoded,
+            'decode_seconds': round(self.seconds, 6),
+        }
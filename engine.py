@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import telegram
+from telegram.utils.request import Request
+
+import homework
+from accounts import load_accounts
+from cursor import save_cursor
+from commands import COMMANDS_ENABLED, CommandPoller
+from logs import LOG_LEVEL, queue_handler
+from metrics import METRICS_PORT, POLL_PERIOD, start_server
+from scheduler import MIN_POLL_INTERVAL, PollQueue
+from sender import DRAIN_TIMEOUT, SEND_WORKERS, MessageSender
+from sharding import (
+    LEASE_GRACE, SHARD_COUNT, SHARD_INDEX, shard_accounts, shard_name
+)
+from storage import LeaseStore, Outbox, StatusStore
+from tracing import install_dump_handler
+
+
+CONCURRENCY = int(os.getenv('CONCURRENCY', 50))
+
+
+class AsyncEngine:
+    """Polls many Practicum accounts concurrently on one event loop.
+
+    Each account runs the same homework.poll_account cycle as the
+    synchronous bot when its turn comes in the poll queue. The cycle is
+    blocking (API, Telegram, the status store and the cursor file), so
+    it runs in a thread pool, while the semaphore bounds how many
+    accounts are being processed at once.
+
+    With leases, an account is only polled while the engine holds its
+    lease, which is renewed until the next poll is due. A lease taken
+    over from another worker reloads the account's notified statuses
+    and cursor first.
+    """
+
+    def __init__(self, bot, accounts, store, concurrency=CONCURRENCY,
+                 leases=None):
+        self.bot = bot
+        self.store = store
+        self.leases = leases
+        self.held = set()
+        self.stopping = False
+        self.wakeup = None
+        self.concurrency = concurrency
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        now = int(time.time())
+        self.states = {
+            account.name: homework.load_state(account, store, now)
+            for account in accounts
+        }
+        self.queue = PollQueue()
+        for state in self.states.values():
+            self.queue.push(0, state)
+
+    async def call(self, func, *args):
+        """Runs a blocking call in the engine's thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    def claim(self, state):
+        """Takes or renews the account's lease until its next poll."""
+        name = state.account.name
+        ttl = max(0, state.due - time.monotonic()) + LEASE_GRACE
+        if not self.leases.claim(name, ttl):
+            self.held.discard(name)
+            return False
+        if name not in self.held:
+            fresh = homework.load_state(
+                state.account, self.store, int(time.time())
+            )
+            state.snapshot, state.hot = fresh.snapshot, fresh.hot
+            state.timestamp = fresh.timestamp
+            self.held.add(name)
+        return True
+
+    async def poll(self, state):
+        """Runs one polling cycle for a single account."""
+        if self.leases is not None and not await self.call(self.claim, state):
+            logging.info(f'{state.account.name} is polled by another worker')
+            return
+        await self.call(homework.poll_account, self.bot, self.store, state)
+
+    async def poll_safely(self, state, semaphore):
+        """Polls the account so its errors never affect the others."""
+        async with semaphore:
+            try:
+                await self.poll(state)
+            except Exception as error:
+                logging.error(
+                    f'The bot faced an error for {state.account.name}: '
+                    f'{error}'
+                )
+            finally:
+                homework.schedule(self.queue, state)
+            if self.leases is not None and state.account.name in self.held:
+                try:
+                    await self.call(self.claim, state)
+                except Exception as error:
+                    logging.error(f'Error while renewing the lease: {error}')
+
+    async def run_cycle(self):
+        """Polls every account that is due."""
+        if self.leases is not None:
+            await self.call(self.leases.heartbeat, LEASE_GRACE)
+        due = self.queue.pop_due(time.monotonic())
+        semaphore = asyncio.Semaphore(self.concurrency)
+        await asyncio.gather(
+            *(self.poll_safely(state, semaphore) for state in due)
+        )
+        return len(due)
+
+    async def run_forever(self):
+        """Polls the accounts as they become due until stopped."""
+        self.wakeup = asyncio.Event()
+        while not self.stopping:
+            started = time.monotonic()
+            polled = await self.run_cycle()
+            logging.debug(
+                f'Polled {polled} accounts in '
+                f'{time.monotonic() - started:.2f}s'
+            )
+            next_due = self.queue.next_due()
+            if next_due is None:
+                next_due = started + MIN_POLL_INTERVAL
+            try:
+                await asyncio.wait_for(
+                    self.wakeup.wait(),
+                    min(max(0, next_due - time.monotonic()), MIN_POLL_INTERVAL)
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        """Makes run_forever return once the cycle in progress is done."""
+        self.stopping = True
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    async def serve(self):
+        """Runs until SIGTERM or SIGINT asks the engine to stop."""
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, self.stop)
+        await self.run_forever()
+
+    def checkpoint(self):
+        """Waits for the running polls and saves every account's cursor."""
+        self.executor.shutdown(wait=True)
+        for state in self.states.values():
+            save_cursor(
+                homework.cursor_file(state.account.name), state.timestamp
+            )
+
+
+def main(index=SHARD_INDEX, count=SHARD_COUNT):
+    """Runs the bot for the accounts of the shard.
+
+    Telegram allows one getUpdates consumer per bot token, so only the
+    first shard answers commands, for the chats of every account.
+
+    On SIGTERM the polls in progress finish, the cursors are saved and
+    the queued messages get DRAIN_TIMEOUT seconds to be delivered before
+    the leases are handed over to the other workers.
+    """
+    if not homework.TELEGRAM_TOKEN:
+        logging.critical("Lack of mandatory environment variables")
+        sys.exit()
+    registry = homework.subscribed(load_accounts(homework.ACCOUNTS_FILE))
+    accounts = shard_accounts(registry, index, count)
+    owner = shard_name(index)
+    os.makedirs(homework.CURSOR_DIR, exist_ok=True)
+    bot = telegram.Bot(
+        token=homework.TELEGRAM_TOKEN,
+        request=Request(con_pool_size=SEND_WORKERS + 1)
+    )
+    sender = MessageSender(bot, Outbox(homework.STATE_DB, owner)).start()
+    store = StatusStore(homework.STATE_DB)
+    POLL_PERIOD.set(value=homework.RETRY_PERIOD)
+    if METRICS_PORT:
+        start_server(METRICS_PORT + index)
+    install_dump_handler()
+    if COMMANDS_ENABLED and index == 0:
+        CommandPoller(
+            bot, sender, registry, admin_chat_id=homework.TELEGRAM_CHAT_ID
+        ).start()
+    leases = LeaseStore(homework.STATE_DB, owner)
+    engine = AsyncEngine(sender, accounts, store, leases=leases)
+    try:
+        asyncio.run(engine.serve())
+    finally:
+        engine.checkpoint()
+        sender.stop(timeout=DRAIN_TIMEOUT)
+        leases.release()
+        store.close()
+        logging.info('The engine has stopped')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=LOG_LEVEL, handlers=[queue_handler()])
+    main()
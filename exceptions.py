@@ -32,3 +32,27 @@ class RequestException(Exception):
     """Exception to check the request."""
 
     pass
+
+
+class ConfigException(Exception):
+    """Exception to check the accounts configuration."""
+
+    pass
+
+
+class DecodeException(Exception):
+    """Exception to check that the API response can be decoded."""
+
+    pass
+
+
+class TransientAPIException(GetAPIException):
+    """Exception to check an API failure that is worth retrying."""
+
+    pass
+
+
+class CircuitOpenException(TransientAPIException):
+    """Exception to fail fast while the API keeps failing."""
+
+    pass
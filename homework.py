@@ -1,16 +1,38 @@
+import contextlib
 import logging
 import os
-import json
+import signal
 import sys
 
 import requests
 import time
 import telegram
 
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from http import HTTPStatus
+from requests.adapters import HTTPAdapter
 
 import exceptions
+from client import ApiSession
+from decoder import Decoder
+from logs import LOG_LEVEL, queue_handler
+from metrics import (
+    API_RESPONSES, API_SECONDS, FAILURES, LOOP_LAG, METRICS_PORT,
+    POLL_PERIOD, start_server
+)
+from accounts import (
+    Account, AccountState, load_accounts, load_subscriptions, subscribe
+)
+from cursor import load_cursor, save_cursor
+from records import Homework, StatusCodes
+from recording import RECORD_FILE, Recorder
+from resilience import breaker_for, retry_delay
+from scheduler import MIN_POLL_INTERVAL, AdaptiveScheduler, PollQueue
+from sender import DRAIN_TIMEOUT, MessageSender, merge_items
+from storage import Outbox, StatusStore
+from tracing import TRACER, install_dump_handler
+from validator import HOMEWORK_SCHEMA, RESPONSE_SCHEMA, Validator
 
 
 load_dotenv()
@@ -24,6 +46,20 @@ RETRY_PERIOD = 600
 ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
 HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
 
+POOL_SIZE = int(os.getenv('POOL_SIZE', 10))
+CONNECT_TIMEOUT = float(os.getenv('CONNECT_TIMEOUT', 5))
+READ_TIMEOUT = float(os.getenv('READ_TIMEOUT', 30))
+TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+CURSOR_FILE = os.getenv('CURSOR_FILE', 'cursor.txt')
+CURSOR_DIR = os.getenv('CURSOR_DIR', 'cursors')
+ACCOUNTS_FILE = os.getenv('ACCOUNTS_FILE', 'accounts.json')
+STATE_DB = os.getenv('STATE_DB', 'homework.db')
+SUBSCRIPTIONS_FILE = os.getenv('SUBSCRIPTIONS_FILE', 'subscriptions.json')
+DEFAULT_ACCOUNT = 'default'
+POLL_MODE = os.getenv('POLL_MODE', 'single')
+THREAD_WORKERS = int(os.getenv('THREAD_WORKERS', 20))
+CYCLE_BUDGET = float(os.getenv('CYCLE_BUDGET', RETRY_PERIOD))
+
 
 HOMEWORK_VERDICTS = {
     'approved': 'Work checked: the reviewer liked everything. Yay!',
@@ -31,17 +67,39 @@ HOMEWORK_VERDICTS = {
     'rejected': 'Work checked: the reviewer has comments.'
 }
 
+STATUS_POLL_INTERVALS = {
+    'approved': None,
+    'reviewing': MIN_POLL_INTERVAL,
+    'rejected': RETRY_PERIOD
+}
+
+STATUS_CODES = StatusCodes(HOMEWORK_VERDICTS)
+VERDICTS = tuple(HOMEWORK_VERDICTS.values())
+
+DECODER = Decoder()
+RECORDER = Recorder(RECORD_FILE) if RECORD_FILE else None
+RESPONSE_VALIDATOR = Validator(RESPONSE_SCHEMA)
+HOMEWORK_VALIDATOR = Validator(
+    HOMEWORK_SCHEMA, choices={'status': HOMEWORK_VERDICTS},
+    record=lambda item: Homework.from_dict(item, STATUS_CODES)
+)
+
 
 def check_tokens():
     """Checks if environment variables are available."""
+    if POLL_MODE == 'threads':
+        return bool(TELEGRAM_TOKEN)
     return all([PRACTICUM_TOKEN, TELEGRAM_TOKEN, TELEGRAM_CHAT_ID])
 
 
-def send_message(bot, message):
+def send_message(bot, message, chat_id=None, key=None):
     """Sends a message to the Telegram chat."""
+    if chat_id is None:
+        chat_id = TELEGRAM_CHAT_ID
+    kwargs = {} if key is None else {'key': key}
     try:
         logging.info('Sending the message')
-        bot.send_message(TELEGRAM_CHAT_ID, message)
+        bot.send_message(chat_id, message, **kwargs)
         logging.debug('The message has been sent')
     except telegram.error.TelegramError as error:
         error_message = f'Error while sending the message: {error}'
@@ -49,56 +107,405 @@ def send_message(bot, message):
         raise exceptions.SendMessageException(error_message)
 
 
-def get_api_answer(timestamp):
-    """Makes a request to a single endpoint of the API service."""
-    headers = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
-    payload = {'from_date': timestamp}
+def create_session(token=None, pool_size=POOL_SIZE):
+    """Creates a pooled keep-alive session with prebuilt auth headers.
+
+    Proxy and CA bundle settings are read from the environment once
+    here rather than on every request.
+    """
+    session = ApiSession()
+    session.trust_env = False
+    session.proxies.update(requests.utils.get_environ_proxies(ENDPOINT))
+    session.verify = (
+        os.getenv('REQUESTS_CA_BUNDLE') or os.getenv('CURL_CA_BUNDLE') or True
+    )
+    if token is None:
+        session.headers.update(HEADERS)
+    else:
+        session.headers.update({'Authorization': f'OAuth {token}'})
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def is_transient(status_code):
+    """Checks if a failed request is worth retrying."""
+    return (
+        status_code == HTTPStatus.TOO_MANY_REQUESTS
+        or status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+    )
+
+
+def request_api(get, headers, payload):
+    """Sends the request through the endpoint's circuit breaker.
+
+    Connection errors, timeouts, 429 and 5xx answers count as failures
+    of the endpoint and raise TransientAPIException; while the circuit
+    is open the request is not sent at all.
+    """
+    breaker = breaker_for(ENDPOINT)
     try:
-        homework_statuses = requests.get(
-            ENDPOINT, headers=headers, params=payload
-        )
-        if homework_statuses.status_code != HTTPStatus.OK:
-            raise exceptions.GetAPIException('Request status is not 200')
-    except requests.RequestException as error:
-        send_message(f'The server returned the error: {error}')
+        breaker.before_call()
+    except exceptions.CircuitOpenException:
+        API_RESPONSES.inc('circuit_open')
+        raise
     try:
-        return homework_statuses.json()
-    except json.JSONDecodeError:
-        send_message('The server returned invalid json')
+        with API_SECONDS.time():
+            response = get(
+                ENDPOINT, headers=headers, params=payload, timeout=TIMEOUT
+            )
+    except requests.RequestException as error:
+        API_RESPONSES.inc('error')
+        breaker.failure()
+        raise exceptions.TransientAPIException(
+            f'The server returned the error: {error}'
+        ) from error
+    API_RESPONSES.inc(str(int(response.status_code)))
+    if is_transient(response.status_code):
+        breaker.failure()
+        raise exceptions.TransientAPIException(
+            f'Request status is {response.status_code}'
+        )
+    breaker.success()
+    return response
+
+
+def get_api_answer(timestamp, session=None):
+    """Makes a request to a single endpoint of the API service.
+
+    With a session, a repeated query is sent as a conditional request,
+    and None is returned when the API answers 304 Not Modified. A body
+    that is not valid JSON raises DecodeException, and a failure worth
+    retrying raises TransientAPIException.
+    """
+    payload = {'from_date': timestamp}
+    if session is None:
+        get, headers = requests.get, HEADERS
+    else:
+        get, headers = session.get, session.conditional_headers(payload)
+    homework_statuses = request_api(get, headers, payload)
+    if session is not None:
+        session.count(homework_statuses)
+    if homework_statuses.status_code == HTTPStatus.NOT_MODIFIED:
+        return None
+    if homework_statuses.status_code != HTTPStatus.OK:
+        raise exceptions.GetAPIException('Request status is not 200')
+    if session is None:
+        return DECODER.decode(homework_statuses.content)
+    response = session.decoder.decode(homework_statuses.content)
+    session.remember(payload, homework_statuses)
+    return response
 
 
 def check_response(response):
     """Checks the API response for compliance with the documentation."""
-    if not isinstance(response, dict):
-        raise TypeError('The response from API is not a dictionary')
+    return RESPONSE_VALIDATOR.parse(response)['homeworks']
+
+
+def parse_status(homework):
+    """Retrieves the status of homework."""
+    return status_message(HOMEWORK_VALIDATOR.parse(homework))
 
-    if 'homeworks' not in response:
-        raise KeyError(f'The key "homeworks" has not been found in {response}')
 
-    if not isinstance(response['homeworks'], list):
-        raise TypeError('There's no list in the "homeworks" key')
+def status_message(homework):
+    """Returns the status change message of a validated homework."""
+    verdict = VERDICTS[homework.code]
+    return (
+        f'The status of the work "{homework.name}" review has changed. '
+        f'{verdict}'
+    )
 
-    homeworks = response.get('homeworks')
-    if not homeworks:
-        raise KeyError('There are no values in the "homeworks" key')
 
-    return homeworks
+def cursor_file(account):
+    """Returns the path of the polling cursor of the account."""
+    if account == DEFAULT_ACCOUNT:
+        return CURSOR_FILE
+    return os.path.join(CURSOR_DIR, f'{account}.txt')
 
 
-def parse_status(homework):
-    """Retrieves the status of homework."""
-    if 'homework_name' not in homework:
-        raise KeyError('Missing "homework_name" key in API response')
-    if 'status' not in homework:
-        raise KeyError('Missing "status" key in API response')
-    homework_name = homework['homework_name']
-    homework_status = homework['status']
-    if homework_status not in HOMEWORK_VERDICTS:
-        raise exceptions.StatusException(
-            f'Unknown operation status: {homework_status}'
+def transition_key(account, homework):
+    """Returns the idempotency key of a homework status change."""
+    return ':'.join((
+        account, homework.key, homework.status, str(homework.date_updated)
+    ))
+
+
+def diff_homeworks(snapshot, homeworks):
+    """Returns the homeworks whose status differs from the snapshot."""
+    latest = {homework.key: homework for homework in homeworks}
+    return [
+        homework for homework in latest.values()
+        if snapshot.get(homework.key) != homework.status
+    ]
+
+
+def is_hot(status):
+    """Checks if a homework in this status can still change soon."""
+    return STATUS_POLL_INTERVALS.get(status) is not None
+
+
+def load_state(account, store, now):
+    """Restores the polling state of the account."""
+    snapshot = {
+        key: STATUS_CODES.intern(status)
+        for key, status in store.load_snapshot(account.name).items()
+    }
+    return AccountState(
+        account=account,
+        session=create_session(account.practicum_token),
+        snapshot=snapshot,
+        timestamp=load_cursor(cursor_file(account.name), now),
+        scheduler=AdaptiveScheduler(RETRY_PERIOD),
+        hot={
+            key: status for key, status in snapshot.items() if is_hot(status)
+        },
+    )
+
+
+def validate_response(response):
+    """Returns the raw homeworks list and the records of the valid ones.
+
+    Failures are counted by stage and exception class; a malformed
+    homework is logged and skipped without holding up the rest.
+    """
+    try:
+        items = check_response(response)
+    except Exception as error:
+        FAILURES.inc('check_response', type(error).__name__)
+        raise
+    homeworks, errors = HOMEWORK_VALIDATOR.validate(items)
+    for index, error in errors:
+        FAILURES.inc('parse_status', type(error).__name__)
+        logging.error(f'Skipping homework {index}: {error}')
+    return items, homeworks
+
+
+def next_delay(state):
+    """Returns the seconds until the account should be polled again.
+
+    Homeworks that are in progress cap the adaptive interval by the
+    interval of their status, while terminal ones are not in the hot
+    set and leave the account to back off. After transient API failures
+    the account is retried sooner, with a jittered exponential backoff.
+    """
+    delay = state.scheduler.delay()
+    for status in state.hot.values():
+        delay = min(delay, STATUS_POLL_INTERVALS[status])
+    if state.failures:
+        delay = min(delay, retry_delay(state.failures))
+    return delay
+
+
+def broadcast(bot, message, chats, key):
+    """Sends the message to every chat, isolating the chats that fail.
+
+    The first chat keeps the transition key and every other chat gets
+    its own, so each delivery is deduplicated separately. The error is
+    raised only if no chat accepted the message.
+    """
+    failed = []
+    for chat_id in chats:
+        chat_key = key if chat_id == chats[0] else f'{key}@{chat_id}'
+        try:
+            send_message(bot, message, chat_id, chat_key)
+        except exceptions.SendMessageException as error:
+            failed.append(error)
+    if failed and len(failed) == len(chats):
+        raise failed[0]
+
+
+def notify(bot, store, state, transitions, trace):
+    """Sends the status changes of a cycle and remembers them.
+
+    The changes are merged into as few messages as the Telegram length
+    limit allows, each keyed by the transitions it carries.
+    """
+    account = state.account
+    with trace.span('parse'):
+        messages = merge_items([
+            ((transition_key(account.name, homework),), account.chat_id,
+             status_message(homework))
+            for homework in transitions
+        ])
+    with trace.span('send'):
+        for keys, _, message in messages:
+            broadcast(bot, message, account.chats, '|'.join(keys))
+    for homework in transitions:
+        store.set_status(
+            account.name, homework.key, homework.status,
+            homework.date_updated
+        )
+        state.snapshot[homework.key] = homework.status
+        if is_hot(homework.status):
+            state.hot[homework.key] = homework.status
+        else:
+            state.hot.pop(homework.key, None)
+
+
+def fetch(state):
+    """Gets the account's API answer, counting the transient failures."""
+    try:
+        response = get_api_answer(state.timestamp, state.session)
+    except exceptions.TransientAPIException:
+        state.failures += 1
+        raise
+    except exceptions.DecodeException as error:
+        FAILURES.inc('decode', type(error).__name__)
+        raise
+    finally:
+        logging.debug(
+            f'Traffic of {state.account.name}: {state.session.stats()}'
         )
-    verdict = HOMEWORK_VERDICTS[homework_status]
-    return f'The status of the work "{homework_name}" review has changed. {verdict}'
+    state.failures = 0
+    return response
+
+
+def poll_account(bot, store, state):
+    """Runs one polling cycle for the account.
+
+    Advances the account's scheduler and returns the number of status
+    changes. The cursor only moves when the response has homeworks,
+    so an idle account repeats the same query and can get a 304. The
+    stages of the cycle are timed into the tracer's ring buffer.
+    """
+    account = state.account
+    if state.due:
+        LOOP_LAG.observe(max(0, time.monotonic() - state.due))
+    with TRACER.cycle(account.name) as trace:
+        with trace.span('fetch'):
+            response = fetch(state)
+        if response is None:
+            logging.debug(f'No change in status for {account.name}')
+            state.scheduler.record(0)
+            return 0
+        if RECORDER is not None:
+            RECORDER.record(account.name, response, time.time())
+        with trace.span('validate'):
+            items, homeworks = validate_response(response)
+        with trace.span('diff'):
+            transitions = diff_homeworks(state.snapshot, homeworks)
+        if transitions:
+            notify(bot, store, state, transitions, trace)
+    if not transitions:
+        logging.debug(f'No change in status for {account.name}')
+    if items:
+        state.timestamp = response.get('current_date') or state.timestamp
+        save_cursor(cursor_file(account.name), state.timestamp)
+    state.scheduler.record(len(transitions))
+    return len(transitions)
+
+
+def schedule(queue, state):
+    """Puts the account back in the poll queue at its next due time."""
+    state.due = time.monotonic() + next_delay(state)
+    queue.push(state.due, state)
+
+
+def subscribed(accounts):
+    """Adds the chats from SUBSCRIPTIONS_FILE to the accounts."""
+    return subscribe(accounts, load_subscriptions(SUBSCRIPTIONS_FILE))
+
+
+def report_slow_polls(running, now):
+    """Forgets finished polls and reports those over CYCLE_BUDGET."""
+    for name, (future, submitted) in list(running.items()):
+        if future.done():
+            del running[name]
+        elif now - submitted > CYCLE_BUDGET:
+            logging.warning(f'{name} exceeded the cycle budget')
+
+
+def poll_accounts_threaded(bot, store, accounts):
+    """Polls the accounts in a thread pool, each on its own schedule.
+
+    Accounts wait in a heap ordered by their next due time and are
+    submitted to the pool when they are due; after a poll the account
+    goes back to the heap with the delay its statuses call for. A poll
+    running longer than CYCLE_BUDGET is reported, and it never holds up
+    the other accounts. On exit the running polls finish and every
+    account's cursor is saved.
+    """
+    os.makedirs(CURSOR_DIR, exist_ok=True)
+    now = int(time.time())
+    queue = PollQueue()
+    states = [load_state(account, store, now) for account in accounts]
+    for state in states:
+        queue.push(0, state)
+    running = {}
+
+    def poll(state):
+        try:
+            poll_account(bot, store, state)
+        except Exception as error:
+            logging.error(
+                f'The bot faced an error for {state.account.name}: {error}'
+            )
+        finally:
+            schedule(queue, state)
+
+    try:
+        with ThreadPoolExecutor(max_workers=THREAD_WORKERS) as executor:
+            while True:
+                started = time.monotonic()
+                for state in queue.pop_due(started):
+                    running[state.account.name] = (
+                        executor.submit(poll, state), started
+                    )
+                report_slow_polls(running, started)
+                queue.wait(MIN_POLL_INTERVAL)
+    finally:
+        for state in states:
+            save_cursor(cursor_file(state.account.name), state.timestamp)
+
+
+class Shutdown:
+    """SIGTERM handling that never interrupts a poll.
+
+    While the main thread polls, SIGTERM only sets the flag and the loop
+    stops once the poll is over. Between polls nothing is in flight, so
+    SIGTERM exits the wait at once. Either way the cursors are saved and
+    the queued messages get DRAIN_TIMEOUT seconds to be delivered.
+    """
+
+    def __init__(self):
+        """Starts with no stop requested."""
+        self.requested = False
+        self.polling = False
+
+    def install(self):
+        """Handles SIGTERM from now on."""
+        signal.signal(signal.SIGTERM, self.stop)
+
+    def stop(self, signum=None, frame=None):
+        """Asks the bot to stop after the poll in progress."""
+        logging.info('Stopping the bot')
+        self.requested = True
+        if not self.polling:
+            raise SystemExit(0)
+
+    @contextlib.contextmanager
+    def poll(self):
+        """Keeps SIGTERM from interrupting the block."""
+        self.polling = True
+        try:
+            yield
+        finally:
+            self.polling = False
+
+
+SHUTDOWN = Shutdown()
+
+
+def poll_once(bot, store, state):
+    """Polls the account, logging errors; SIGTERM waits until it is done."""
+    try:
+        with SHUTDOWN.poll():
+            poll_account(bot, store, state)
+    except ConnectionError:
+        pass
+    except Exception as error:
+        logging.error(f"The bot faced an error {error}")
 
 
 def main():
@@ -107,41 +514,38 @@ def main():
         logging.critical("Lack of mandatory environment variables")
         sys.exit()
     bot = telegram.Bot(token=TELEGRAM_TOKEN)
-    timestamp = int(time.time())
-
-    error_message = ''
-
-    while True:
+    sender = MessageSender(bot, Outbox(STATE_DB)).start()
+    store = StatusStore(STATE_DB)
+    POLL_PERIOD.set(value=RETRY_PERIOD)
+    if METRICS_PORT:
+        start_server()
+    install_dump_handler()
+    SHUTDOWN.install()
+    try:
+        if POLL_MODE == 'threads':
+            poll_accounts_threaded(
+                sender, store, subscribed(load_accounts(ACCOUNTS_FILE))
+            )
+            return
+        account, = subscribed(
+            [Account(DEFAULT_ACCOUNT, PRACTICUM_TOKEN, TELEGRAM_CHAT_ID)]
+        )
+        state = load_state(account, store, int(time.time()))
         try:
-            response = get_api_answer(timestamp)
-            homeworks = check_response(response)
-            if homeworks:
-                message = parse_status(homeworks[0])
-                send_message(bot, message)
-            else:
-                message = 'No change in the status of the homework'
-                send_message(bot, message)
-            if message != error_message:
-                send_message(bot, message)
-                error_message = message
-            else:
-                logging.info('No change in status')
-
-        except ConnectionError:
-            pass
-        except Exception as error:
-            error_message = error
-            logging.error(f"The bot faced an error {error_message}")
+            while True:
+                poll_once(sender, store, state)
+                if SHUTDOWN.requested:
+                    break
+                delay = next_delay(state)
+                state.due = time.monotonic() + delay
+                time.sleep(delay)
         finally:
-            time.sleep(RETRY_PERIOD)
+            save_cursor(cursor_file(account.name), state.timestamp)
+    finally:
+        sender.stop(timeout=DRAIN_TIMEOUT)
+        store.close()
 
 
 if __name__ == '__main__':
-    logging.basicConfig(
-        level=logging.DEBUG,
-        filename='main.log',
-        format='%(funcName)s, %(lineno)s, %(levelname)s, %(message)s',
-        handlers=[logging.FileHandler('main.log', 'w', encoding='utf-8'),
-                  logging.StreamHandler(sys.stdout)]
-    )
+    logging.basicConfig(level=LOG_LEVEL, handlers=[queue_handler()])
     main()
@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import (
+    QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+)
+
+
+LOG_FILE = os.getenv('LOG_FILE', 'main.log')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 2 ** 20))
+LOG_BACKUPS = int(os.getenv('LOG_BACKUPS', 5))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN')
+TEXT_FORMAT = (
+    '%(asctime)s, %(funcName)s, %(lineno)s, %(levelname)s, %(message)s'
+)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats log records as one JSON object per line."""
+
+    def format(self, record):
+        """Returns the record as a JSON document."""
+        return json.dumps({
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'function': record.funcName,
+            'line': record.lineno,
+            'message': record.getMessage(),
+        }, ensure_ascii=False)
+
+
+class LogQueueHandler(QueueHandler):
+    """Queue handler that owns the listener writing its records.
+
+    Logging calls only put the record on an unbounded queue; the files
+    are written by the listener thread, so a slow disk never holds up
+    a poll or a send. Closing the handler, which logging.shutdown does
+    at exit, flushes the queue.
+    """
+
+    def __init__(self, handlers):
+        super().__init__(queue.SimpleQueue())
+        self.setFormatter(logging.Formatter('%(message)s'))
+        self.listener = QueueListener(
+            self.queue, *handlers, respect_handler_level=True
+        )
+
+    def start(self):
+        """Starts the listener thread."""
+        self.listener.start()
+        return self
+
+    def close(self):
+        """Writes out the queued records and stops the listener."""
+        self.listener.stop()
+        for handler in self.listener.handlers:
+            handler.close()
+        super().close()
+
+
+def file_handler(path):
+    """Returns the rotating handler for the log file.
+
+    The file is rotated at midnight or another LOG_ROTATE_WHEN interval
+    if it is set and by size otherwise; it is never truncated on start.
+    """
+    if LOG_ROTATE_WHEN:
+        return TimedRotatingFileHandler(
+            path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUPS,
+            encoding='utf-8'
+        )
+    return RotatingFileHandler(
+        path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+        encoding='utf-8'
+    )
+
+
+def queue_handler(path=LOG_FILE, log_format=LOG_FORMAT):
+    """Returns a started handler writing to the file and stdout."""
+    if log_format == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+    handlers = [file_handler(path), logging.StreamHandler(sys.stdout)]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return LogQueueHandler(handlers).start()
@@ -0,0 +1,242 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tracing import TRACER
+
+
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30
+)
+LAG_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800)
+
+
+def escape(value):
+    """Escapes a label value for the text exposition format."""
+    return (
+        str(value).replace('\\', r'\\').replace('"', r'\"')
+        .replace('\n', r'\n')
+    )
+
+
+def format_labels(names, values, extra=()):
+    """Returns the {name="value",...} part of a sample line."""
+    pairs = [
+        f'{name}="{escape(value)}"'
+        for name, value in (*zip(names, values), *extra)
+    ]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *values, amount=1):
+        """Adds the amount to the series with the label values."""
+        with self.lock:
+            self.values[values] = self.values.get(values, 0) + amount
+
+    def samples(self):
+        """Returns the sample lines of every series."""
+        with self.lock:
+            values = sorted(self.values.items())
+        return [
+            f'{self.name}{format_labels(self.labels, key)} {value}'
+            for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    kind = 'gauge'
+
+    def set(self, *values, value):
+        """Sets the series with the label values."""
+        with self.lock:
+            self.values[values] = value
+
+
+class Histogram:
+    """Cumulative histogram of observed values with optional labels."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *values):
+        """Records the value in the series with the label values."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(values)
+            if series is None:
+                series = self.series[values] = [
+                    [0] * (len(self.buckets) + 1), 0.0
+                ]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *values):
+        """Observes the seconds the block takes, even if it raises."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, *values)
+
+    def samples(self):
+        """Returns the bucket, sum and count lines of every series."""
+        with self.lock:
+            series = sorted(
+                (key, list(counts), total)
+                for key, (counts, total) in self.series.items()
+            )
+        lines = []
+        for key, counts, total in series:
+            cumulative = 0
+            bounds = (*map(str, self.buckets), '+Inf')
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                labels = format_labels(self.labels, key, (('le', bound),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = format_labels(self.labels, key)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Set of metrics exposed together."""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """Adds the metric to the registry and returns it."""
+        self.metrics.append(metric)
+        return metric
+
+    def exposition(self):
+        """Returns every metric in the Prometheus text format."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+API_SECONDS = REGISTRY.register(Histogram(
+    'homework_api_request_seconds',
+    'Latency of the Practicum API requests.'
+))
+API_RESPONSES = REGISTRY.register(Counter(
+    'homework_api_responses_total',
+    'Practicum API responses by HTTP status code.', ('code',)
+))
+FAILURES = REGISTRY.register(Counter(
+    'homework_failures_total',
+    'Failed response checks by stage and exception class.',
+    ('stage', 'exception')
+))
+SEND_SECONDS = REGISTRY.register(Histogram(
+    'homework_send_seconds',
+    'Latency of the Telegram sendMessage calls.'
+))
+SEND_RETRIES = REGISTRY.register(Counter(
+    'homework_send_retries_total',
+    'Telegram sends retried by reason.', ('reason',)
+))
+SENDS = REGISTRY.register(Counter(
+    'homework_sends_total',
+    'Telegram messages by delivery outcome.', ('outcome',)
+))
+COALESCED = REGISTRY.register(Counter(
+    'homework_messages_coalesced_total',
+    'Messages merged into another Telegram message of the same chat.'
+))
+LOOP_LAG = REGISTRY.register(Histogram(
+    'homework_loop_lag_seconds',
+    'Delay between the time a poll was due and the time it started.',
+    buckets=LAG_BUCKETS
+))
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    'homework_circuit_state',
+    'Circuit breaker state by endpoint: 0 closed, 1 half-open, 2 open.',
+    ('endpoint',)
+))
+COMMANDS_HANDLED = REGISTRY.register(Counter(
+    'homework_commands_total',
+    'Telegram commands answered by command.', ('command',)
+))
+COMMAND_CACHE = REGISTRY.register(Counter(
+    'homework_command_cache_total',
+    'Homework lookups of the commands by cache outcome.', ('outcome',)
+))
+POLL_PERIOD = REGISTRY.register(Gauge(
+    'homework_retry_period_seconds',
+    'Configured RETRY_PERIOD the loop lag is measured against.'
+))
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serves the registry at /metrics and recent cycles at /debug."""
+
+    registry = REGISTRY
+
+    def do_GET(self):
+        """Answers with the exposition, the trace report or 404."""
+        path = self.path.split('?')[0]
+        if path == '/metrics':
+            self.answer(self.registry.exposition(), CONTENT_TYPE)
+        elif path == '/debug':
+            self.answer(TRACER.report() + '\n', 'text/plain; charset=utf-8')
+        else:
+            self.send_error(404)
+
+    def answer(self, text, content_type):
+        """Sends the text as a 200 response."""
+        body = text.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Keeps scrapes out of the bot log."""
+
+
+def start_server(port=METRICS_PORT, host=METRICS_HOST):
+    """Serves the metrics from a daemon thread and returns the server."""
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name='metrics', daemon=True
+    ).start()
+    return server
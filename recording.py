@@ -0,0 +1,40 @@
+import json
+import os
+import threading
+import time
+
+
+RECORD_FILE = os.getenv('RECORD_FILE')
+
+
+class Recorder:
+    """Appends API answers to a JSON lines file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def record(self, account, response, now=None):
+        """Saves the decoded answer the account got at the time."""
+        line = json.dumps({
+            'at': time.time() if now is None else now,
+            'account': account,
+            'body': response,
+        }, ensure_ascii=False)
+        with self.lock, open(self.path, 'a', encoding='utf-8') as file:
+            file.write(line + '\n')
+
+
+def load_recording(path):
+    """Returns (at, body) timelines of the recorded answers by account."""
+    timelines = {}
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                entry = json.loads(line)
+                timelines.setdefault(entry['account'], []).append(
+                    (entry['at'], entry['body'])
+                )
+    for timeline in timelines.values():
+        timeline.sort(key=lambda entry: entry[0])
+    return timelines
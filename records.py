@@ -0,0 +1,70 @@
+import sys
+
+
+class StatusCodes:
+    """Small integer codes of the known homework statuses.
+
+    Each status string is interned once, so records and snapshots share
+    it instead of keeping the copy every decoded response makes.
+    """
+
+    def __init__(self, statuses):
+        self.statuses = tuple(sys.intern(status) for status in statuses)
+        self.codes = {
+            status: code for code, status in enumerate(self.statuses)
+        }
+
+    def code(self, status):
+        """Returns the code of a known status."""
+        return self.codes[status]
+
+    def status(self, code):
+        """Returns the shared status string of the code."""
+        return self.statuses[code]
+
+    def intern(self, status):
+        """Returns the shared copy of the status string."""
+        code = self.codes.get(status)
+        return sys.intern(status) if code is None else self.statuses[code]
+
+
+class Homework:
+    """Homework from the API response that passed validation.
+
+    The record has no __dict__: its fields are slots, the status is a
+    shared string and code is its index in HOMEWORK_VERDICTS.
+    """
+
+    __slots__ = ('key', 'name', 'code', 'status', 'date_updated')
+
+    def __init__(self, key, name, code, status, date_updated=None):
+        self.key = key
+        self.name = name
+        self.code = code
+        self.status = status
+        self.date_updated = date_updated
+
+    @classmethod
+    def from_dict(cls, item, codes):
+        """Builds the record from a validated homework dict."""
+        name = item['homework_name']
+        key = item['id'] if item.get('id') is not None else name
+        code = codes.code(item['status'])
+        return cls(
+            str(key), name, code, codes.status(code), item.get('date_updated')
+        )
+
+    def astuple(self):
+        """Returns the fields of the record."""
+        return (self.key, self.name, self.code, self.status, self.date_updated)
+
+    def __eq__(self, other):
+        if not isinstance(other, Homework):
+            return NotImplemented
+        return self.astuple() == other.astuple()
+
+    def __repr__(self):
+        return (
+            f'Homework(key={self.key!r}, name={self.name!r}, '
+            f'status={self.status!r}, date_updated={self.date_updated!r})'
+        )
@@ -0,0 +1,185 @@
+"""Replay recorded API answers through the polling loop.
+
+Replaying a recording made with RECORD_FILE runs the same poll_account /
+next_delay / schedule cycle as the bot under a virtual clock, so days of
+polling take seconds:
+
+    python replay.py recording.jsonl --days 7
+"""
+import argparse
+import bisect
+import contextlib
+import json
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+
+import homework
+from accounts import Account
+from client import ApiSession
+from recording import load_recording
+from scheduler import PollQueue
+from storage import StatusStore
+
+
+class VirtualClock:
+    """Clock whose sleep advances time instantly."""
+
+    def __init__(self, start):
+        self.now = start
+        self.slept = 0.0
+
+    def time(self):
+        """Returns the virtual Unix time."""
+        return self.now
+
+    def monotonic(self):
+        """Returns the virtual time, which never goes back."""
+        return self.now
+
+    def sleep(self, seconds):
+        """Moves the clock forward instead of waiting."""
+        seconds = max(0, seconds)
+        self.now += seconds
+        self.slept += seconds
+
+    @contextlib.contextmanager
+    def installed(self):
+        """Makes the bot's loop read and wait on this clock."""
+        original, homework.time = homework.time, self
+        try:
+            yield self
+        finally:
+            homework.time = original
+
+
+class ReplayResponse:
+    """Response object with what get_api_answer reads."""
+
+    def __init__(self, status_code, body=None, etag=None):
+        self.status_code = status_code
+        self.content = b'' if body is None else json.dumps(body).encode()
+        self.headers = {} if etag is None else {'ETag': etag}
+        self.raw = None
+
+
+class ReplaySession(ApiSession):
+    """Session answering from the account's recorded timeline.
+
+    A request gets the last answer recorded before the virtual time,
+    and a 304 if it is the one the session has already seen.
+    """
+
+    def __init__(self, timeline, clock):
+        super().__init__()
+        self.times = [at for at, _ in timeline]
+        self.bodies = [body for _, body in timeline]
+        self.clock = clock
+
+    def get(self, url, headers=None, params=None, timeout=None):
+        """Returns the recorded answer as of the virtual time."""
+        index = bisect.bisect_right(self.times, self.clock.time()) - 1
+        if index < 0:
+            return ReplayResponse(200, {
+                'homeworks': [], 'current_date': int(self.clock.time())
+            })
+        etag = f'"{index}"'
+        if (headers or {}).get('If-None-Match') == etag:
+            return ReplayResponse(304, etag=etag)
+        return ReplayResponse(200, self.bodies[index], etag)
+
+
+class CountingBot:
+    """Bot that keeps the messages instead of sending them."""
+
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, chat_id, text, key=None):
+        """Keeps the message."""
+        self.messages.append((chat_id, text))
+
+
+@dataclass
+class ReplayReport:
+    """What a replay produced."""
+
+    simulated: float
+    wall: float
+    polls: int
+    requests: int
+    not_modified: int
+    messages: int
+    errors: int
+
+
+def replay(timelines, duration, start=None, bot=None):
+    """Replays the timelines through the polling loop for duration seconds.
+
+    Accounts are polled one at a time in the order they become due, with
+    the delays the bot itself would choose.
+    """
+    if start is None:
+        start = min(timeline[0][0] for timeline in timelines.values())
+    bot = CountingBot() if bot is None else bot
+    clock = VirtualClock(start)
+    queue = PollQueue()
+    polls = errors = 0
+    started = time.monotonic()
+    with tempfile.TemporaryDirectory() as directory, clock.installed():
+        store = StatusStore(os.path.join(directory, 'homework.db'))
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            os.makedirs(homework.CURSOR_DIR)
+            states = []
+            for index, (name, timeline) in enumerate(timelines.items()):
+                state = homework.load_state(
+                    Account(name, name, str(index)), store,
+                    int(clock.time())
+                )
+                state.session = ReplaySession(timeline, clock)
+                states.append(state)
+                queue.push(clock.monotonic(), state)
+            while clock.monotonic() < start + duration:
+                for state in queue.pop_due(clock.monotonic()):
+                    polls += 1
+                    try:
+                        homework.poll_account(bot, store, state)
+                    except Exception:
+                        errors += 1
+                    finally:
+                        homework.schedule(queue, state)
+                clock.sleep(queue.next_due() - clock.monotonic())
+        finally:
+            os.chdir(cwd)
+            store.close()
+    return ReplayReport(
+        simulated=clock.now - start,
+        wall=time.monotonic() - started,
+        polls=polls,
+        requests=sum(state.session.requests_sent for state in states),
+        not_modified=sum(state.session.not_modified for state in states),
+        messages=len(bot.messages),
+        errors=errors,
+    )
+
+
+def main():
+    """Replays a recording and prints what it produced."""
+    parser = argparse.ArgumentParser(description='Replay recorded answers.')
+    parser.add_argument('recording')
+    parser.add_argument('--days', type=float, default=1.0)
+    options = parser.parse_args()
+    report = replay(load_recording(options.recording), options.days * 86400)
+    print(
+        f'{report.simulated / 86400:.1f} simulated days in '
+        f'{report.wall:.1f}s: {report.polls} polls, {report.requests} '
+        f'requests ({report.not_modified} not modified), '
+        f'{report.messages} messages, {report.errors} errors'
+    )
+
+
+if __name__ == '__main__':
+    main()
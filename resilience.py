@@ -0,0 +1,105 @@
+import logging
+import os
+import random
+import threading
+import time
+
+import exceptions
+from metrics import CIRCUIT_STATE
+
+
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', 1))
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', 30))
+BREAKER_THRESHOLD = int(os.getenv('BREAKER_THRESHOLD', 5))
+BREAKER_RESET = float(os.getenv('BREAKER_RESET', 10))
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def retry_delay(failures, base=RETRY_BASE_DELAY, cap=RETRY_MAX_DELAY):
+    """Returns the jittered delay before the retry after the failures.
+
+    The ceiling doubles with every consecutive failure up to the cap and
+    the delay is drawn uniformly below it, so accounts failing together
+    do not retry together.
+    """
+    ceiling = min(cap, base * 2 ** max(0, failures - 1))
+    return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """Fails calls to an endpoint fast while it keeps failing.
+
+    The circuit opens after threshold consecutive failures and rejects
+    calls until reset seconds have passed. Then it is half-open: one
+    probe call is let through, and its outcome closes the circuit or
+    opens it again.
+    """
+
+    def __init__(self, name, threshold=BREAKER_THRESHOLD,
+                 reset=BREAKER_RESET, clock=time.monotonic):
+        self.name = name
+        self.threshold = threshold
+        self.reset = reset
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened = 0.0
+        self.probing = False
+        self.lock = threading.Lock()
+        CIRCUIT_STATE.set(name, value=STATE_VALUES[CLOSED])
+
+    def set_state(self, state):
+        """Moves the circuit to the state; called with the lock held."""
+        if state != self.state:
+            logging.warning(f'Circuit of {self.name} is {state}')
+        self.state = state
+        CIRCUIT_STATE.set(self.name, value=STATE_VALUES[state])
+
+    def before_call(self):
+        """Raises CircuitOpenException if the call is not let through."""
+        with self.lock:
+            if self.state == OPEN:
+                if self.clock() - self.opened < self.reset:
+                    raise exceptions.CircuitOpenException(
+                        f'Circuit of {self.name} is open'
+                    )
+                self.set_state(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self.probing:
+                    raise exceptions.CircuitOpenException(
+                        f'Circuit of {self.name} is probing'
+                    )
+                self.probing = True
+
+    def success(self):
+        """Records a call the endpoint answered."""
+        with self.lock:
+            self.failures = 0
+            self.probing = False
+            self.set_state(CLOSED)
+
+    def failure(self):
+        """Records a call that failed for a transient reason."""
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.state == HALF_OPEN or self.failures >= self.threshold:
+                self.opened = self.clock()
+                self.set_state(OPEN)
+
+
+BREAKERS = {}
+BREAKERS_LOCK = threading.Lock()
+
+
+def breaker_for(endpoint):
+    """Returns the circuit breaker shared by the calls to the endpoint."""
+    with BREAKERS_LOCK:
+        breaker = BREAKERS.get(endpoint)
+        if breaker is None:
+            breaker = BREAKERS[endpoint] = CircuitBreaker(endpoint)
+        return breaker
@@ -0,0 +1,90 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+
+
+MIN_POLL_INTERVAL = float(os.getenv('MIN_POLL_INTERVAL', 60))
+MAX_POLL_INTERVAL = float(os.getenv('MAX_POLL_INTERVAL', 3600))
+BACKOFF_FACTOR = float(os.getenv('BACKOFF_FACTOR', 2))
+POLL_JITTER = float(os.getenv('POLL_JITTER', 0.1))
+
+
+class AdaptiveScheduler:
+    """Poll interval that backs off while nothing changes.
+
+    Every poll without a status change multiplies the interval by the
+    backoff factor up to the maximum; a change snaps it back to the
+    minimum. Jitter spreads the polls of many accounts over time.
+    """
+
+    def __init__(self, interval, min_interval=MIN_POLL_INTERVAL,
+                 max_interval=MAX_POLL_INTERVAL, factor=BACKOFF_FACTOR,
+                 jitter=POLL_JITTER):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.jitter = jitter
+        self.interval = self.clamp(interval)
+
+    def clamp(self, interval):
+        """Keeps the interval within the configured bounds."""
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def record(self, changes):
+        """Adjusts the interval to the number of changes in the last poll."""
+        if changes:
+            self.interval = self.min_interval
+        else:
+            self.interval = self.clamp(self.interval * self.factor)
+
+    def delay(self):
+        """Returns the jittered number of seconds until the next poll."""
+        spread = self.interval * self.jitter
+        return self.clamp(self.interval + random.uniform(-spread, spread))
+
+
+class PollQueue:
+    """Heap of items ordered by the time their next poll is due."""
+
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.pushed = threading.Condition(self.lock)
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, due, item):
+        """Schedules the item to be polled at the due time."""
+        with self.pushed:
+            heapq.heappush(self.heap, (due, next(self.counter), item))
+            self.pushed.notify_all()
+
+    def wait(self, timeout, clock=time.monotonic):
+        """Waits until the first item is due, at most timeout seconds.
+
+        Pushing an item wakes the waiter, so an item scheduled sooner
+        than the one it was waiting for is not held up.
+        """
+        with self.pushed:
+            if self.heap:
+                timeout = min(timeout, self.heap[0][0] - clock())
+            if timeout > 0:
+                self.pushed.wait(timeout)
+
+    def pop_due(self, now):
+        """Removes and returns every item that is due by now."""
+        items = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                items.append(heapq.heappop(self.heap)[2])
+        return items
+
+    def next_due(self):
+        """Returns the earliest due time or None for an empty queue."""
+        with self.lock:
+            return self.heap[0][0] if self.heap else None
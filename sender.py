@@ -0,0 +1,436 @@
+import heapq
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import telegram
+
+from metrics import COALESCED, SEND_RETRIES, SEND_SECONDS, SENDS
+
+GLOBAL_RATE = float(os.getenv('GLOBAL_RATE', 30))
+CHAT_RATE = float(os.getenv('CHAT_RATE', 1))
+SEND_QUEUE_SIZE = int(os.getenv('SEND_QUEUE_SIZE', 1000))
+SEND_QUEUE_TIMEOUT = float(os.getenv('SEND_QUEUE_TIMEOUT', 5))
+REPLAY_INTERVAL = float(os.getenv('REPLAY_INTERVAL', 30))
+REPLAY_BATCH = int(os.getenv('REPLAY_BATCH', 100))
+SEND_WORKERS = int(os.getenv('SEND_WORKERS', 8))
+FLUSH_WINDOW = float(os.getenv('FLUSH_WINDOW', 0.5))
+DRAIN_TIMEOUT = float(os.getenv('DRAIN_TIMEOUT', 20))
+MAX_MESSAGE_LENGTH = telegram.constants.MAX_MESSAGE_LENGTH
+IDLE_INTERVAL = 0.5
+TRUNCATION_MARK = '…'
+PERMANENT_ERRORS = (
+    telegram.error.BadRequest,
+    telegram.error.Unauthorized,
+)
+
+
+class TokenBucket:
+    """Token bucket limiting how often an action may happen."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = max(capacity or rate, 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        """Adds the tokens accumulated since the last refill."""
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def delay(self, now):
+        """Returns how many seconds are left until a token is available."""
+        self.refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now):
+        """Takes one token from the bucket."""
+        self.refill(now)
+        self.tokens -= 1
+
+
+def fit_message(text, limit=MAX_MESSAGE_LENGTH):
+    """Truncates the text to the Telegram message length limit."""
+    if len(text) <= limit:
+        return text
+    return text[:limit - len(TRUNCATION_MARK)] + TRUNCATION_MARK
+
+
+def merge_items(items, limit=MAX_MESSAGE_LENGTH):
+    """Merges (ids, chat_id, text) items for one chat, keeping their order.
+
+    The texts are joined into as few messages as the length limit
+    allows, each with the ids of the items it carries.
+    """
+    chat_id = items[0][1]
+    merged, ids, texts, length = [], [], [], 0
+    for item_ids, _, text in items:
+        text = fit_message(text, limit)
+        if texts and length + len(text) + 2 > limit:
+            merged.append((ids, chat_id, '\n\n'.join(texts)))
+            ids, texts, length = [], [], 0
+        ids.extend(item_ids)
+        texts.append(text)
+        length += len(text) + 2
+    merged.append((ids, chat_id, '\n\n'.join(texts)))
+    return merged
+
+
+def batch_messages(rows, limit=MAX_MESSAGE_LENGTH):
+    """Joins (id, chat_id, text) rows into (ids, chat_id, text) batches.
+
+    Messages for the same chat are merged into as few Telegram messages
+    as the length limit allows, keeping their order.
+    """
+    chats = {}
+    for message_id, chat_id, text in rows:
+        chats.setdefault(chat_id, []).append(([message_id], chat_id, text))
+    batches = []
+    for items in chats.values():
+        batches.extend(merge_items(items, limit))
+    return batches
+
+
+class MessageSender:
+    """Delivers Telegram messages from a bounded queue in a worker thread.
+
+    It has the same send_message(chat_id, text) method as telegram.Bot,
+    so it can be passed wherever the bot is used. Delivery is limited
+    by a global token bucket and a bucket per chat; a message for a chat
+    that is out of tokens is postponed without holding up other chats,
+    and RetryAfter errors pause the worker for the requested time.
+
+    Every message is stored in the outbox before it is queued and removed
+    once delivered, so a message accepted by send_message is never lost.
+    Messages left there by a network failure, a full queue or a restart
+    are replayed every REPLAY_INTERVAL seconds, merged into one Telegram
+    message per chat where possible.
+
+    Messages queued for a chat within the flush window are merged into
+    one Telegram message. The messages that pass the rate limits are
+    sent by a pool of workers, one chat at a time, so a chat that is
+    slow, flood-limited or gone does not delay the others. The last
+    outcome of every chat is kept in the outbox.
+    """
+
+    def __init__(self, bot, outbox, global_rate=GLOBAL_RATE,
+                 chat_rate=CHAT_RATE, maxsize=SEND_QUEUE_SIZE,
+                 workers=SEND_WORKERS, window=FLUSH_WINDOW):
+        self.bot = bot
+        self.outbox = outbox
+        self.chat_rate = chat_rate
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_buckets = {}
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.delayed = []
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.inflight = set()
+        self.busy = set()
+        self.lines = {}
+        self.window = window
+        self.buffers = {}
+        self.freed = queue.SimpleQueue()
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='deliver'
+        )
+        self.stranded = True
+        self.next_replay = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name='sender', daemon=True
+        )
+
+    def start(self):
+        """Starts the worker thread."""
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stops the worker after the queued messages are delivered."""
+        self.stopped.set()
+        self.wake()
+        self.thread.join(timeout)
+
+    def wake(self):
+        """Wakes the dispatcher waiting for the queue."""
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def send_message(self, chat_id, text, key=None):
+        """Stores the message in the outbox and queues it for delivery.
+
+        The key identifies the event the message is about, so the same
+        event is stored only once while its message is pending. Messages
+        without a key are never deduplicated.
+        """
+        if key is None:
+            key = uuid.uuid4().hex
+        text = fit_message(text)
+        with self.lock:
+            message_id = self.outbox.add(key, chat_id, text)
+            if message_id is None:
+                logging.debug('The message is already in the outbox')
+                return
+            self.inflight.add(message_id)
+        ids = (message_id,)
+        try:
+            self.queue.put((ids, chat_id, text), timeout=SEND_QUEUE_TIMEOUT)
+        except queue.Full:
+            self.release(ids)
+            logging.warning('The send queue is full, kept in the outbox')
+
+    def pending(self):
+        """Returns the number of messages waiting for delivery."""
+        return (
+            self.queue.qsize() + len(self.delayed)
+            + sum(len(line) for line in self.lines.values())
+            + sum(len(items) for _, items in self.buffers.values())
+        )
+
+    def release(self, ids):
+        """Leaves undelivered messages in the outbox for a later replay."""
+        with self.lock:
+            self.inflight.difference_update(ids)
+            self.stranded = True
+            self.next_replay = time.monotonic() + REPLAY_INTERVAL
+
+    def replay_due(self):
+        """Checks if the outbox should be replayed now."""
+        return (
+            self.stranded and not self.stopped.is_set()
+            and time.monotonic() >= self.next_replay
+        )
+
+    def replay(self):
+        """Schedules a batch of the messages left in the outbox."""
+        with self.lock:
+            rows = [
+                row for row in self.outbox.pending(
+                    REPLAY_BATCH + len(self.inflight)
+                )
+                if row[0] not in self.inflight
+            ][:REPLAY_BATCH]
+            self.inflight.update(row[0] for row in rows)
+            self.stranded = len(rows) == REPLAY_BATCH
+        if rows:
+            logging.info(f'Replaying {len(rows)} messages from the outbox')
+        now = time.monotonic()
+        for item in batch_messages(rows):
+            heapq.heappush(self.delayed, (now, next(self.counter), item))
+
+    def next_item(self):
+        """Returns the next message to deliver or None after a timeout.
+
+        A postponed message comes back as (item, True): it is older than
+        anything queued for its chat since.
+        """
+        timeout = IDLE_INTERVAL
+        if self.buffers:
+            deadline = min(deadline for deadline, _ in self.buffers.values())
+            timeout = max(0, min(timeout, deadline - time.monotonic()))
+        if self.delayed:
+            due = self.delayed[0][0] - time.monotonic()
+            if due <= 0:
+                return heapq.heappop(self.delayed)[2], True
+            timeout = min(timeout, due)
+        try:
+            return self.queue.get(timeout=timeout), False
+        except queue.Empty:
+            return None, False
+
+    def buffer(self, item):
+        """Holds the message until the flush window of its chat closes."""
+        chat_id = item[1]
+        if chat_id in self.buffers:
+            self.buffers[chat_id][1].append(item)
+        else:
+            self.buffers[chat_id] = (time.monotonic() + self.window, [item])
+
+    def flush(self):
+        """Dispatches the merged messages of the chats whose window closed.
+
+        Once the sender is stopped every buffer is flushed at once.
+        """
+        now = time.monotonic()
+        for chat_id, (deadline, items) in list(self.buffers.items()):
+            if deadline > now and not self.stopped.is_set():
+                continue
+            del self.buffers[chat_id]
+            merged = merge_items(items)
+            COALESCED.inc(amount=len(items) - len(merged))
+            for item in merged:
+                try:
+                    self.process(item)
+                except Exception as error:
+                    logging.error(f'Unexpected error in the sender: {error}')
+                    self.release(item[0])
+
+    def resume(self):
+        """Dispatches the next waiting message of every freed chat."""
+        while True:
+            try:
+                chat_id = self.freed.get_nowait()
+            except queue.Empty:
+                return
+            line = self.lines.get(chat_id)
+            if line:
+                item = line.popleft()
+                if not line:
+                    del self.lines[chat_id]
+                self.process(item, first=True)
+
+    def run(self):
+        """Dispatches messages until stopped and drained."""
+        try:
+            self.dispatch_all()
+        finally:
+            self.executor.shutdown(wait=True)
+
+    def maintain(self):
+        """Replays the outbox when due and resumes the freed chats."""
+        if self.replay_due():
+            try:
+                self.replay()
+            except Exception as error:
+                logging.error(f'Error while replaying the outbox: {error}')
+                self.next_replay = time.monotonic() + REPLAY_INTERVAL
+        try:
+            self.resume()
+        except Exception as error:
+            logging.error(f'Unexpected error in the sender: {error}')
+
+    def dispatch_all(self):
+        """Hands the messages to the workers as the limits allow."""
+        while not self.stopped.is_set() or self.pending():
+            self.maintain()
+            self.flush()
+            item, first = self.next_item()
+            if item is None:
+                continue
+            if self.window and not first:
+                self.buffer(item)
+                continue
+            try:
+                self.process(item, first)
+            except Exception as error:
+                logging.error(f'Unexpected error in the sender: {error}')
+                self.release(item[0])
+
+    def process(self, item, first=False):
+        """Dispatches the message or postpones it until its chat is free.
+
+        While a worker is sending to the chat, its next messages wait in
+        the chat's line, in order; the first flag puts a message that
+        was already waiting at the front.
+        """
+        ids, chat_id, text = item
+        now = time.monotonic()
+        with self.lock:
+            busy = chat_id in self.busy
+        if busy or (chat_id in self.lines and not first):
+            line = self.lines.setdefault(chat_id, deque())
+            if first:
+                line.appendleft(item)
+            else:
+                line.append(item)
+            return
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, capacity=1)
+            self.chat_buckets[chat_id] = bucket
+        chat_delay = bucket.delay(now)
+        if chat_delay:
+            heapq.heappush(
+                self.delayed, (now + chat_delay, next(self.counter), item)
+            )
+            return
+        global_delay = self.global_bucket.delay(now)
+        if global_delay:
+            time.sleep(global_delay)
+            now = time.monotonic()
+        self.global_bucket.consume(now)
+        bucket.consume(now)
+        with self.lock:
+            self.busy.add(chat_id)
+        self.executor.submit(self.dispatch, ids, chat_id, text)
+
+    def dispatch(self, ids, chat_id, text):
+        """Delivers the message in a worker, keeping its errors there."""
+        try:
+            self.deliver(ids, chat_id, text)
+        except Exception as error:
+            logging.error(f'Unexpected error in the sender: {error}')
+            self.record(chat_id, 'failed', error)
+            self.release(ids)
+        finally:
+            with self.lock:
+                self.busy.discard(chat_id)
+            self.freed.put(chat_id)
+            self.wake()
+
+    def record(self, chat_id, outcome, error=None):
+        """Counts the outcome and keeps it as the last one of the chat."""
+        SENDS.inc(outcome)
+        try:
+            self.outbox.record_outcome(chat_id, outcome, error)
+        except Exception as store_error:
+            logging.error(f'Error while recording the outcome: {store_error}')
+
+    def deliver(self, ids, chat_id, text):
+        """Sends the message, waiting out Telegram flood limits."""
+        while True:
+            try:
+                with SEND_SECONDS.time():
+                    self.bot.send_message(chat_id, text)
+                self.record(chat_id, 'delivered')
+                logging.debug(f'The message to {chat_id} has been delivered')
+                self.complete(ids)
+                return
+            except telegram.error.RetryAfter as error:
+                logging.warning(
+                    f'Flood limit hit, retrying in {error.retry_after}s'
+                )
+                SEND_RETRIES.inc('retry_after')
+                time.sleep(error.retry_after)
+            except telegram.error.ChatMigrated as error:
+                logging.warning(
+                    f'Chat {chat_id} migrated to {error.new_chat_id}'
+                )
+                SEND_RETRIES.inc('chat_migrated')
+                chat_id = error.new_chat_id
+            except PERMANENT_ERRORS as error:
+                logging.error(
+                    f'Error while delivering the message to {chat_id}, '
+                    f'dropping it: {error}'
+                )
+                self.record(chat_id, 'dropped', error)
+                self.complete(ids)
+                return
+            except telegram.error.TelegramError as error:
+                logging.error(
+                    f'Error while delivering the message to {chat_id}: '
+                    f'{error}'
+                )
+                self.record(chat_id, 'failed', error)
+                self.release(ids)
+                return
+
+    def complete(self, ids):
+        """Removes finished messages from the outbox."""
+        self.outbox.remove(ids)
+        with self.lock:
+            self.inflight.difference_update(ids)
@@ -0,0 +1,64 @@
+import bisect
+import hashlib
+import os
+import uuid
+
+import exceptions
+
+
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', 1))
+SHARD_INDEX = int(os.getenv('SHARD_INDEX', 0))
+SHARD_VNODES = int(os.getenv('SHARD_VNODES', 64))
+LEASE_GRACE = float(os.getenv('LEASE_GRACE', 120))
+
+
+def ring_hash(key):
+    """Returns a stable 64-bit hash of the key."""
+    return int.from_bytes(
+        hashlib.blake2b(str(key).encode(), digest_size=8).digest(), 'big'
+    )
+
+
+class HashRing:
+    """Consistent hash ring mapping keys to nodes.
+
+    Every node is placed on the ring at vnodes points; a key belongs to
+    the node of the first point after its hash. Adding or removing a
+    node only moves the keys of the points it gains or loses.
+    """
+
+    def __init__(self, nodes, vnodes=SHARD_VNODES):
+        points = sorted(
+            (ring_hash(f'{node}#{number}'), node)
+            for node in nodes for number in range(vnodes)
+        )
+        self.hashes = [point for point, _ in points]
+        self.nodes = [node for _, node in points]
+
+    def owner(self, key):
+        """Returns the node the key belongs to."""
+        index = bisect.bisect(self.hashes, ring_hash(key))
+        return self.nodes[index % len(self.nodes)]
+
+
+def shard_name(index=SHARD_INDEX):
+    """Returns a lease owner name for a process of the shard.
+
+    The name is unique to the process, so an old and a new process of
+    the same shard running side by side never share leases.
+    """
+    return f'shard-{index}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+
+
+def shard_accounts(accounts, index=SHARD_INDEX, count=SHARD_COUNT):
+    """Returns the accounts that belong to the shard."""
+    if count < 1 or not 0 <= index < count:
+        raise exceptions.ConfigException(
+            f'Invalid shard {index} of {count}'
+        )
+    if count == 1:
+        return list(accounts)
+    ring = HashRing(range(count))
+    return [
+        account for account in accounts if ring.owner(account.name) == index
+    ]
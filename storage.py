@@ -0,0 +1,223 @@
+import sqlite3
+import threading
+import time
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS homework_status (
+    account TEXT NOT NULL,
+    homework_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    date_updated TEXT,
+    notified_at REAL NOT NULL,
+    PRIMARY KEY (account, homework_id)
+) WITHOUT ROWID
+"""
+
+
+class StatusStore:
+    """Last known status of every tracked homework, kept in SQLite."""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(SCHEMA)
+        self.connection.commit()
+
+    def load_snapshot(self, account):
+        """Returns the last notified statuses of the account by homework id."""
+        with self.lock:
+            return dict(self.connection.execute(
+                'SELECT homework_id, status FROM homework_status '
+                'WHERE account = ?',
+                (account,)
+            ))
+
+    def set_status(self, account, homework_id, status, date_updated=None):
+        """Saves the status the user has just been notified about."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT INTO homework_status '
+                '(account, homework_id, status, date_updated, notified_at) '
+                'VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (account, homework_id) DO UPDATE SET '
+                'status = excluded.status, '
+                'date_updated = excluded.date_updated, '
+                'notified_at = excluded.notified_at',
+                (account, str(homework_id), status, date_updated, time.time())
+            )
+
+    def close(self):
+        """Closes the database connection."""
+        self.connection.close()
+
+
+OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    chat_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    owner TEXT NOT NULL DEFAULT ''
+)
+"""
+
+OUTCOME_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_outcome (
+    chat_id TEXT PRIMARY KEY,
+    outcome TEXT NOT NULL,
+    error TEXT,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+LEASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lease (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+
+class Outbox:
+    """Messages accepted for delivery but not yet sent to Telegram.
+
+    Worker processes sharing the database each replay only the messages
+    they stored, and take over those of a worker that holds no leases.
+    """
+
+    def __init__(self, path, owner=''):
+        self.owner = owner
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(OUTBOX_SCHEMA)
+        self.connection.execute(OUTCOME_SCHEMA)
+        self.connection.execute(LEASE_SCHEMA)
+        columns = {
+            row[1] for row in self.connection.execute(
+                'PRAGMA table_info(outbox)'
+            )
+        }
+        if 'owner' not in columns:
+            self.connection.execute(
+                "ALTER TABLE outbox ADD COLUMN owner TEXT NOT NULL DEFAULT ''"
+            )
+        self.connection.commit()
+
+    def add(self, key, chat_id, text):
+        """Stores the message and returns its id, or None if it is queued."""
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                'INSERT OR IGNORE INTO outbox '
+                '(key, chat_id, text, created_at, owner) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, str(chat_id), text, time.time(), self.owner)
+            )
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def pending(self, limit):
+        """Returns the oldest undelivered messages as (id, chat_id, text).
+
+        Messages of owners without a live lease are adopted first.
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                'UPDATE outbox SET owner = ? WHERE owner != ? AND owner '
+                'NOT IN (SELECT owner FROM lease WHERE expires_at > ?)',
+                (self.owner, self.owner, time.time())
+            )
+            return self.connection.execute(
+                'SELECT id, chat_id, text FROM outbox WHERE owner = ? '
+                'ORDER BY id LIMIT ?',
+                (self.owner, limit)
+            ).fetchall()
+
+    def remove(self, ids):
+        """Deletes delivered messages."""
+        ids = list(ids)
+        if not ids:
+            return
+        placeholders = ', '.join('?' * len(ids))
+        with self.lock, self.connection:
+            self.connection.execute(
+                f'DELETE FROM outbox WHERE id IN ({placeholders})', ids
+            )
+
+    def record_outcome(self, chat_id, outcome, error=None):
+        """Saves the outcome of the last delivery to the chat."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT INTO chat_outcome '
+                '(chat_id, outcome, error, updated_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (chat_id) DO UPDATE SET '
+                'outcome = excluded.outcome, error = excluded.error, '
+                'updated_at = excluded.updated_at',
+                (
+                    str(chat_id), outcome,
+                    None if error is None else str(error), time.time()
+                )
+            )
+
+    def outcomes(self):
+        """Returns the last (outcome, error) of every chat by chat id."""
+        with self.lock:
+            return {
+                chat_id: (outcome, error)
+                for chat_id, outcome, error in self.connection.execute(
+                    'SELECT chat_id, outcome, error FROM chat_outcome'
+                )
+            }
+
+    def close(self):
+        """Closes the database connection."""
+        self.connection.close()
+
+
+class LeaseStore:
+    """Time-limited ownership of accounts shared by worker processes.
+
+    An account is polled only by the worker holding its lease; a lease
+    that was not renewed in time can be taken over by another worker.
+    """
+
+    def __init__(self, path, owner):
+        self.owner = owner
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute(LEASE_SCHEMA)
+        self.connection.commit()
+
+    def claim(self, name, ttl):
+        """Takes or renews the lease for ttl seconds if it is free."""
+        now = time.time()
+        with self.lock, self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO lease (name, owner, expires_at) VALUES (?, ?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET '
+                'owner = excluded.owner, expires_at = excluded.expires_at '
+                'WHERE lease.owner = excluded.owner '
+                'OR lease.expires_at <= ?',
+                (name, self.owner, now + ttl, now)
+            )
+        return cursor.rowcount == 1
+
+    def heartbeat(self, ttl):
+        """Keeps the owner alive for ttl seconds even without accounts."""
+        return self.claim(f'worker:{self.owner}', ttl)
+
+    def release(self):
+        """Gives up every lease of the owner."""
+        with self.lock, self.connection:
+            self.connection.execute(
+                'DELETE FROM lease WHERE owner = ?', (self.owner,)
+            )
+
+    def close(self):
+        """Closes the database connection."""
+        self.connection.close()
@@ -0,0 +1,143 @@
+"""Supervisor running the engine shards in pre-forked worker processes.
+
+Usage: WORKERS=4 python supervisor.py
+
+Each worker runs engine.main for its own shard. A worker that exits is
+restarted after a jittered exponential backoff, reset once it has run
+for RESTART_RESET seconds. SIGTERM or SIGINT is passed on to the
+workers, which finish their polls, save their cursors and drain their
+sends; those still running after SHUTDOWN_TIMEOUT are killed.
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+import engine
+from logs import LOG_FILE, LOG_LEVEL, queue_handler
+from resilience import retry_delay
+
+
+WORKERS = int(os.getenv('WORKERS', os.cpu_count() or 1))
+RESTART_BASE_DELAY = float(os.getenv('RESTART_BASE_DELAY', 1))
+RESTART_MAX_DELAY = float(os.getenv('RESTART_MAX_DELAY', 60))
+RESTART_RESET = float(os.getenv('RESTART_RESET', 60))
+SHUTDOWN_TIMEOUT = float(os.getenv('SHUTDOWN_TIMEOUT', 28))
+MONITOR_INTERVAL = 0.5
+
+
+def worker_log_file(index, path=LOG_FILE):
+    """Returns the log file of the worker next to the main one."""
+    root, extension = os.path.splitext(path)
+    return f'{root}-{index}{extension}'
+
+
+def run_worker(index, count):
+    """Runs the engine of the shard in a worker process."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    logging.basicConfig(
+        level=LOG_LEVEL, handlers=[queue_handler(worker_log_file(index))],
+        force=True
+    )
+    engine.main(index, count)
+
+
+class Worker:
+    """Slot of a worker process and its restart history."""
+
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.started = 0.0
+        self.failures = 0
+        self.restart_at = None
+
+
+class Supervisor:
+    """Keeps one worker process running for every shard."""
+
+    def __init__(self, count=WORKERS, target=run_worker,
+                 base_delay=RESTART_BASE_DELAY, max_delay=RESTART_MAX_DELAY,
+                 reset=RESTART_RESET, context=None):
+        self.count = count
+        self.target = target
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.reset = reset
+        self.context = context or multiprocessing.get_context('fork')
+        self.workers = [Worker(index) for index in range(count)]
+        self.stopping = threading.Event()
+
+    def spawn(self, worker):
+        """Starts the worker's process."""
+        worker.process = self.context.Process(
+            target=self.target, args=(worker.index, self.count),
+            name=f'worker-{worker.index}'
+        )
+        worker.process.start()
+        worker.started = time.monotonic()
+        worker.restart_at = None
+        logging.info(
+            f'Started worker {worker.index} (pid {worker.process.pid})'
+        )
+
+    def check(self, now):
+        """Restarts the workers that exited, backing off repeated crashes."""
+        for worker in self.workers:
+            if worker.process.is_alive():
+                continue
+            if worker.restart_at is None:
+                if now - worker.started >= self.reset:
+                    worker.failures = 0
+                worker.failures += 1
+                delay = retry_delay(
+                    worker.failures, self.base_delay, self.max_delay
+                )
+                worker.restart_at = now + delay
+                logging.error(
+                    f'Worker {worker.index} exited with code '
+                    f'{worker.process.exitcode}, restarting in {delay:.1f}s'
+                )
+            elif now >= worker.restart_at:
+                worker.process.join()
+                self.spawn(worker)
+
+    def stop(self, signum=None, frame=None):
+        """Asks the supervisor to shut down."""
+        self.stopping.set()
+
+    def run(self):
+        """Starts the workers and watches them until asked to stop."""
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self.stop)
+        for worker in self.workers:
+            self.spawn(worker)
+        while not self.stopping.wait(MONITOR_INTERVAL):
+            self.check(time.monotonic())
+        self.shutdown()
+
+    def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """Stops the workers, killing those that do not exit in time."""
+        processes = [
+            worker.process for worker in self.workers
+            if worker.process is not None and worker.process.is_alive()
+        ]
+        for process in processes:
+            process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in processes:
+            process.join(max(0, deadline - time.monotonic()))
+        for process in processes:
+            if process.is_alive():
+                logging.error(f'{process.name} did not stop in time, killing')
+                process.kill()
+                process.join()
+        logging.info('All workers have stopped')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=LOG_LEVEL)
+    Supervisor().run()
@@ -29,3 +29,17 @@ def random_message():
         letters = string.ascii_letters
         return ''.join(random.choice(letters) for _ in range(string_length))
     return random_string()
+
+
+@pytest.fixture(autouse=True)
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def closed_circuits():
+    import resilience
+    resilience.BREAKERS.clear()
+    yield
+    resilience.BREAKERS.clear()
@@ -0,0 +1,17 @@
+from benchmarks import throughput
+
+
+class TestThroughputBenchmark:
+
+    def test_engine_runs_against_the_stubs(self):
+        results = throughput.run(
+            accounts=3, homeworks=2, duration=1, change_rate=0.5,
+            api_latency=0, telegram_latency=0
+        )
+        assert results['polls'] > 3, (
+            'Check that the engine polls the Practicum stub.'
+        )
+        assert results['messages'] > 0, (
+            'Check that status changes reach the Telegram stub.'
+        )
+        assert results['p50'] <= results['p99']
@@ -1,5 +1,6 @@
 import inspect
 import logging
+import os
 import re
 import time
 from http import HTTPStatus
@@ -47,8 +48,8 @@ class TestHomework:
                           'TELEGRAM_CHAT_ID', 'RETRY_PERIOD',
                           'ENDPOINT', 'HEADERS', 'HOMEWORK_VERDICTS')
     HOMEWORK_FUNC_WITH_PARAMS_QTY = {
-        'send_message': 2,
-        'get_api_answer': 1,
+        'send_message': 4,
+        'get_api_answer': 2,
         'check_response': 1,
         'parse_status': 1,
         'check_tokens': 0,
@@ -222,6 +223,30 @@ class TestHomework:
             f'Проверьте, что функция `{func_name}` возвращает словарь.'
         )
 
+    def test_get_api_answer_with_session(self, monkeypatch, random_timestamp,
+                                         current_timestamp, homework_module):
+        session = homework_module.create_session(token='sometoken')
+        assert session.headers['Authorization'] == 'OAuth sometoken', (
+            'Check that the session is created with the auth header.'
+        )
+        calls = []
+
+        def mock_session_get(*args, **kwargs):
+            calls.append(kwargs)
+            return utils.MockResponseGET(
+                *args, random_timestamp=random_timestamp, **kwargs
+            )
+
+        monkeypatch.setattr(session, 'get', mock_session_get)
+        result = homework_module.get_api_answer(current_timestamp, session)
+        assert isinstance(result, dict)
+        assert len(calls) == 1, (
+            'Check that `get_api_answer` sends the request via the session.'
+        )
+        assert calls[0]['timeout'] == homework_module.TIMEOUT, (
+            'Check that the request is sent with connect/read timeouts.'
+        )
+
     @pytest.mark.parametrize('response', NOT_OK_RESPONSES.values())
     def test_get_not_200_status_response(self,
                                          monkeypatch,
@@ -374,6 +399,98 @@ class TestHomework:
                 '`homework_name`.'
             )
 
+    def test_diff_homeworks_returns_only_transitions(self, homework_module):
+        snapshot = {'1': 'reviewing', '2': 'approved'}
+        homeworks = [
+            {'id': 1, 'homework_name': 'hw1', 'status': 'approved'},
+            {'id': 2, 'homework_name': 'hw2', 'status': 'approved'},
+            {'id': 3, 'homework_name': 'hw3', 'status': 'reviewing'},
+        ]
+        records, errors = homework_module.HOMEWORK_VALIDATOR.validate(
+            homeworks
+        )
+        assert errors == []
+        transitions = homework_module.diff_homeworks(snapshot, records)
+        assert [homework.key for homework in transitions] == ['1', '3'], (
+            'Check that `diff_homeworks` returns every changed homework '
+            'and skips the ones with a known status.'
+        )
+        assert homework_module.diff_homeworks(snapshot, []) == []
+
+    def test_terminal_homeworks_leave_the_hot_set(self, monkeypatch,
+                                                  homework_module):
+        store = homework_module.StatusStore('homework.db')
+        store.set_status('alice', 1, 'reviewing')
+        store.set_status('alice', 2, 'approved')
+        account = homework_module.Account('alice', 'token', '1')
+        state = homework_module.load_state(account, store, 0)
+        assert state.hot == {'1': 'reviewing'}, (
+            'Check that only homeworks in progress are in the hot set.'
+        )
+        assert homework_module.next_delay(state) == (
+            homework_module.STATUS_POLL_INTERVALS['reviewing']
+        ), 'Check that a homework under review is polled at a fast cadence.'
+
+        data = {
+            'homeworks': [{'id': 1, 'homework_name': 'hw', 'status': 'approved'}],
+            'current_date': 1
+        }
+
+        def mock_session_get(*args, **kwargs):
+            response = utils.MockResponseGET(*args, **kwargs)
+            response.json = lambda: data
+            return response
+
+        monkeypatch.setattr(requests.Session, 'get', mock_session_get)
+        os.makedirs(homework_module.CURSOR_DIR)
+        homework_module.poll_account(utils.MockTelegramBot(), store, state)
+        assert state.hot == {}, (
+            'Check that an approved homework drops out of the hot set.'
+        )
+        state.scheduler.record(0)
+        assert homework_module.next_delay(state) > (
+            homework_module.STATUS_POLL_INTERVALS['reviewing']
+        ), 'Check that an account with nothing in progress backs off.'
+
+    def test_changes_of_a_cycle_are_sent_together(self, monkeypatch,
+                                                  homework_module):
+        store = homework_module.StatusStore('homework.db')
+        state = homework_module.load_state(
+            homework_module.Account('alice', 'token', '1'), store, 0
+        )
+        data = {
+            'homeworks': [
+                {'id': 1, 'homework_name': 'hw1', 'status': 'approved'},
+                {'id': 2, 'homework_name': 'hw2', 'status': 'rejected'},
+            ],
+            'current_date': 1
+        }
+
+        def mock_session_get(*args, **kwargs):
+            response = utils.MockResponseGET(*args, **kwargs)
+            response.json = lambda: data
+            return response
+
+        sent = []
+
+        class Bot:
+            def send_message(self, chat_id=None, text=None, **kwargs):
+                sent.append((chat_id, text, kwargs.get('key')))
+
+        monkeypatch.setattr(requests.Session, 'get', mock_session_get)
+        os.makedirs(homework_module.CURSOR_DIR)
+        assert homework_module.poll_account(Bot(), store, state) == 2
+        assert len(sent) == 1, (
+            'Check that the changes of one cycle are merged into a single '
+            'message.'
+        )
+        chat_id, text, key = sent[0]
+        assert 'hw1' in text and 'hw2' in text
+        assert key == 'alice:1:approved:None|alice:2:rejected:None'
+        assert store.load_snapshot('alice') == {
+            '1': 'approved', '2': 'rejected'
+        }
+
     def test_check_response(self, random_timestamp, homework_module):
         func_name = 'check_response'
         utils.check_function(
@@ -559,9 +676,12 @@ class TestHomework:
         )
 
         def sleep_to_interrupt(secs):
-            assert secs == self.RETRY_PERIOD, (
-                'Убедитесь, что повторный запрос к API домашки отправляется '
-                'через 10 минут: `time.sleep(RETRY_PERIOD)`.'
+            scheduler = homework_module.AdaptiveScheduler(self.RETRY_PERIOD)
+            assert (
+                scheduler.min_interval <= secs <= scheduler.max_interval
+            ), (
+                'Check that the next request to the API is scheduled within '
+                'the poll interval bounds.'
             )
             raise utils.BreakInfiniteLoop('break')
 
@@ -588,6 +708,7 @@ class TestHomework:
             )
 
         monkeypatch.setattr(requests, 'get', mock_response_get)
+        monkeypatch.setattr(requests.Session, 'get', mock_response_get)
 
     def test_main_without_env_vars_raise_exception(
             self, caplog, monkeypatch, random_timestamp, current_timestamp,
@@ -728,10 +849,15 @@ class TestHomework:
             'get',
             mock_response_get_with_new_status
         )
+        monkeypatch.setattr(
+            requests.Session,
+            'get',
+            mock_response_get_with_new_status
+        )
 
         hw_status = data_with_new_hw_status['homeworks'][0]['status']
 
-        def mock_send_message(bot, message=''):
+        def mock_send_message(bot, message='', chat_id=None, key=None):
             logging.warn(message)
 
         monkeypatch.setattr(
@@ -753,6 +879,98 @@ class TestHomework:
                     'из переменной `HOMEWORK_VERDICTS`.'
                 )
 
+    def test_sigterm_stops_the_bot_after_the_poll(self, monkeypatch,
+                                                  random_timestamp,
+                                                  current_timestamp,
+                                                  random_message,
+                                                  homework_module):
+        self.mock_main(
+            monkeypatch, random_message, random_timestamp,
+            current_timestamp, homework_module
+        )
+        monkeypatch.setattr(homework_module, 'PRACTICUM_TOKEN', 'sometoken')
+        monkeypatch.setattr(homework_module, 'TELEGRAM_TOKEN', '1234:abcdefg')
+        monkeypatch.setattr(homework_module, 'TELEGRAM_CHAT_ID', '1')
+        shutdown = homework_module.Shutdown()
+        monkeypatch.setattr(shutdown, 'install', lambda: None)
+        monkeypatch.setattr(homework_module, 'SHUTDOWN', shutdown)
+        polls = []
+
+        def poll_with_sigterm(bot, store, state):
+            shutdown.stop()
+            polls.append(state.account.name)
+
+        def sleep_to_fail(secs):
+            raise AssertionError('The bot slept after SIGTERM.')
+
+        monkeypatch.setattr(homework_module, 'poll_account', poll_with_sigterm)
+        monkeypatch.setattr(time, 'sleep', sleep_to_fail)
+        homework_module.main()
+        assert polls == [homework_module.DEFAULT_ACCOUNT], (
+            'Check that SIGTERM lets the poll in progress finish.'
+        )
+        assert os.path.exists(
+            homework_module.cursor_file(homework_module.DEFAULT_ACCOUNT)
+        ), 'Check that the cursor is saved when the bot stops.'
+        with pytest.raises(SystemExit):
+            shutdown.stop()
+
+    def test_threaded_mode_isolates_account_errors(self, monkeypatch,
+                                                   random_timestamp,
+                                                   homework_module):
+        accounts = [
+            homework_module.Account('alice', 'token-alice', '1'),
+            homework_module.Account('broken', 'token-broken', '2'),
+        ]
+        data = {
+            'homeworks': [{'id': 1, 'homework_name': 'hw', 'status': 'approved'}],
+            'current_date': random_timestamp
+        }
+
+        def mock_session_get(session, *args, **kwargs):
+            if session.headers['Authorization'] == 'OAuth token-broken':
+                raise requests.RequestException('Something wrong')
+            response = utils.MockResponseGET(
+                *args, random_timestamp=random_timestamp, **kwargs
+            )
+            response.json = lambda: data
+            return response
+
+        def wait_to_interrupt(queue, timeout):
+            raise utils.BreakInfiniteLoop('break')
+
+        monkeypatch.setattr(requests.Session, 'get', mock_session_get)
+        monkeypatch.setattr(
+            homework_module.PollQueue, 'wait', wait_to_interrupt
+        )
+        bot = utils.MockTelegramBot()
+        store = homework_module.StatusStore('homework.db')
+        with pytest.raises(utils.BreakInfiniteLoop):
+            homework_module.poll_accounts_threaded(bot, store, accounts)
+        assert bot.chat_id == '1', (
+            'Check that the healthy account is notified even though '
+            'the other one fails.'
+        )
+        assert store.load_snapshot('alice') == {'1': 'approved'}
+
+    def test_broadcast_isolates_failed_chats(self, homework_module):
+        sent = []
+
+        class Bot:
+            def send_message(self, chat_id=None, text=None, **kwargs):
+                if chat_id == 'deleted':
+                    raise telegram.error.Unauthorized('bot was blocked')
+                sent.append((chat_id, kwargs.get('key')))
+
+        homework_module.broadcast(
+            Bot(), 'text', ('1', 'deleted', '2'), 'alice:1:approved'
+        )
+        assert sent == [
+            ('1', 'alice:1:approved'), ('2', 'alice:1:approved@2')
+        ], 'Check that every chat gets the message with its own key.'
+        with pytest.raises(homework_module.exceptions.SendMessageException):
+            homework_module.broadcast(Bot(), 'text', ('deleted',), 'key')
+
     def test_docstrings(self, homework_module):
         for func in self.HOMEWORK_FUNC_WITH_PARAMS_QTY:
             utils.check_docstring(homework_module, func)
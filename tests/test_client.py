@@ -0,0 +1,57 @@
+import pytest
+import requests
+
+import homework
+from client import ApiSession
+from decoder import BACKENDS, Decoder
+from exceptions import DecodeException
+
+
+class StubResponse:
+    def __init__(self, status_code=200, headers=None, content=b''):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = content
+        self.raw = None
+
+
+class TestApiSession:
+
+    def test_validators_are_sent_for_a_repeated_query(self):
+        session = ApiSession()
+        response = StubResponse(
+            headers={'ETag': '"v1"', 'Last-Modified': 'Mon'}
+        )
+        session.remember({'from_date': 1}, response)
+        headers = session.conditional_headers({'from_date': 1})
+        assert headers['If-None-Match'] == '"v1"'
+        assert headers['If-Modified-Since'] == 'Mon'
+        assert 'If-None-Match' not in session.conditional_headers(
+            {'from_date': 2}
+        ), 'Check that validators are only sent for the same query.'
+
+    def test_not_modified_response_is_skipped(self, monkeypatch):
+        session = homework.create_session('token')
+        monkeypatch.setattr(
+            requests.Session, 'get',
+            lambda *args, **kwargs: StubResponse(status_code=304)
+        )
+        assert homework.get_api_answer(1, session) is None
+        assert session.stats()['not_modified'] == 1
+
+
+class TestDecoder:
+
+    @pytest.mark.parametrize('backend', sorted(BACKENDS))
+    def test_backends_decode_the_same(self, backend):
+        decoder = Decoder(backend)
+        assert decoder.decode(b'{"homeworks": []}') == {'homeworks': []}
+        assert decoder.stats()['decoded'] == 1
+
+    def test_invalid_json_raises_project_exception(self, monkeypatch):
+        monkeypatch.setattr(
+            requests, 'get',
+            lambda *args, **kwargs: StubResponse(content=b'<html>')
+        )
+        with pytest.raises(DecodeException):
+            homework.get_api_answer(1)
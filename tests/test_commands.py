@@ -0,0 +1,170 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+import utils
+from accounts import Account
+from commands import CommandPoller, StatusCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class UpdatesBot:
+    def __init__(self, messages):
+        self.updates = [
+            SimpleNamespace(
+                update_id=number,
+                message=SimpleNamespace(chat_id=chat_id, text=text)
+            )
+            for number, (chat_id, text) in enumerate(messages)
+        ]
+        self.offsets = []
+
+    def get_updates(self, offset=None, timeout=0):
+        self.offsets.append(offset)
+        updates, self.updates = self.updates, []
+        return updates
+
+
+class RecordingSender:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, chat_id, text, key=None):
+        self.sent.append((chat_id, text))
+
+
+class TestStatusCache:
+
+    def test_concurrent_misses_share_one_load(self):
+        loads = []
+        release = threading.Event()
+
+        def loader(key, previous):
+            loads.append(key)
+            release.wait(5)
+            return f'{key} value'
+
+        cache = StatusCache(loader, ttl=60)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get('a')))
+            for _ in range(10)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        assert loads == ['a'], (
+            'Check that concurrent lookups of a key are coalesced.'
+        )
+        assert results == ['a value'] * 10
+
+    def test_expired_value_is_reloaded_with_the_stale_one(self):
+        clock = FakeClock()
+        calls = []
+
+        def loader(key, previous):
+            calls.append(previous)
+            return len(calls)
+
+        cache = StatusCache(loader, ttl=60, clock=clock)
+        assert cache.get('a') == 1
+        clock.now = 59
+        assert cache.get('a') == 1
+        clock.now = 61
+        assert cache.get('a') == 2
+        assert calls == [None, 1]
+
+    def test_failed_load_is_not_cached(self):
+        def loader(key, previous):
+            raise ValueError('boom')
+
+        cache = StatusCache(loader)
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                cache.get('a')
+        assert cache.flights == {}
+
+
+class TestCommandPoller:
+    ACCOUNTS = [Account('alice', 'token-alice', '1')]
+
+    @pytest.fixture
+    def api_calls(self, monkeypatch, random_timestamp):
+        calls = []
+
+        def mock_session_get(session, *args, **kwargs):
+            calls.append(kwargs['params'])
+            response = utils.MockResponseGET(
+                *args, random_timestamp=random_timestamp, **kwargs
+            )
+            response.json = lambda: {
+                'homeworks': [
+                    {'id': 1, 'homework_name': 'old', 'status': 'approved',
+                     'date_updated': '2024-01-01T00:00:00Z'},
+                    {'id': 2, 'homework_name': 'new', 'status': 'rejected',
+                     'date_updated': '2024-02-01T00:00:00Z'},
+                ],
+                'current_date': random_timestamp
+            }
+            return response
+
+        monkeypatch.setattr(requests.Session, 'get', mock_session_get)
+        return calls
+
+    def run(self, messages, accounts=ACCOUNTS):
+        sender = RecordingSender()
+        poller = CommandPoller(
+            UpdatesBot(messages), sender, accounts, admin_chat_id='9'
+        )
+        poller.poll()
+        poller.executor.shutdown(wait=True)
+        return poller, sorted(sender.sent)
+
+    def test_answers_status_and_history_from_one_request(self, api_calls):
+        poller, sent = self.run([
+            (1, '/status'), (1, '/history'), (1, '/status@homework_bot')
+        ])
+        assert api_calls == [{'from_date': 0}], (
+            'Check that the commands are answered from the cache.'
+        )
+        assert ('1', 'new: rejected\nold: approved') in sent
+        assert sent.count(
+            ('1', 'The work "new": Work checked: the reviewer has comments.')
+        ) == 2
+        assert poller.offset == 3
+
+    def test_ignores_other_chats_and_messages(self, api_calls):
+        _, sent = self.run([
+            (2, '/status'), (1, 'hello'), (1, ' '), (1, '/debug'),
+            (9, '/debug')
+        ])
+        assert api_calls == []
+        assert sent[0] == ('2', 'This chat does not follow any account.')
+        assert [chat_id for chat_id, _ in sent] == ['2', '9'], (
+            'Check that /debug is only answered in the admin chat.'
+        )
+
+    def test_answers_in_subscribed_chats(self, api_calls):
+        accounts = [
+            Account('alice', 'token-alice', '1', subscribers=('5',)),
+            Account('bob', 'token-bob', '2', subscribers=('5',)),
+        ]
+        _, sent = self.run([(2, '/status'), (5, '/status')], accounts)
+        status = 'The work "new": Work checked: the reviewer has comments.'
+        assert sent == [
+            ('2', status),
+            ('5', f'alice:\n{status}\n\nbob:\n{status}'),
+        ], 'Check that a shared chat gets the answer of every account.'
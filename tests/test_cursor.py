@@ -0,0 +1,28 @@
+import os
+
+from cursor import load_cursor, save_cursor
+
+
+class TestCursor:
+
+    def test_load_missing_cursor_returns_default(self, state_dir):
+        path = os.path.join(state_dir, 'cursor.txt')
+        assert load_cursor(path, 42) == 42, (
+            'Check that a missing cursor file falls back to the default.'
+        )
+
+    def test_save_and_load_cursor(self, state_dir):
+        path = os.path.join(state_dir, 'cursor.txt')
+        save_cursor(path, 1000198000)
+        assert load_cursor(path, 0) == 1000198000
+        save_cursor(path, 1000198991)
+        assert load_cursor(path, 0) == 1000198991
+        assert os.listdir(state_dir) == ['cursor.txt'], (
+            'Check that no temporary files are left after saving.'
+        )
+
+    def test_load_corrupted_cursor_returns_default(self, state_dir):
+        path = os.path.join(state_dir, 'cursor.txt')
+        with open(path, 'w') as file:
+            file.write('not a number')
+        assert load_cursor(path, 7) == 7
@@ -0,0 +1,142 @@
+import asyncio
+import json
+import os
+
+import pytest
+import requests
+
+import utils
+from accounts import Account, load_accounts, load_subscriptions, subscribe
+from engine import AsyncEngine
+from exceptions import ConfigException
+from storage import StatusStore
+
+
+class RecordingBot:
+    def __init__(self):
+        self.sent = []
+
+    def send_message(self, chat_id=None, text=None, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+class TestAsyncEngine:
+    ACCOUNTS = [
+        Account('alice', 'token-alice', '1'),
+        Account('bob', 'token-bob', '2'),
+        Account('broken', 'token-broken', '3'),
+    ]
+
+    @pytest.fixture
+    def mock_api(self, monkeypatch, random_timestamp):
+        def mock_session_get(session, *args, **kwargs):
+            token = session.headers['Authorization']
+            if token == 'OAuth token-broken':
+                raise requests.RequestException('Something wrong')
+            response = utils.MockResponseGET(
+                *args, random_timestamp=random_timestamp, **kwargs
+            )
+            homeworks = [{
+                'id': 1,
+                'homework_name': f'{token} hw',
+                'status': 'approved'
+            }]
+            response.json = lambda: {
+                'homeworks': homeworks,
+                'current_date': random_timestamp
+            }
+            return response
+
+        monkeypatch.setattr(requests.Session, 'get', mock_session_get)
+
+    def test_cycle_polls_every_account(self, mock_api, state_dir,
+                                       random_timestamp):
+        bot = RecordingBot()
+        store = StatusStore(str(state_dir / 'homework.db'))
+        (state_dir / 'cursors').mkdir()
+        engine = AsyncEngine(bot, self.ACCOUNTS, store, concurrency=2)
+
+        assert asyncio.run(engine.run_cycle()) == 3
+        assert sorted(chat_id for chat_id, _ in bot.sent) == ['1', '2'], (
+            'Check that every account is notified in its own chat and that '
+            'a failing account does not affect the others.'
+        )
+        assert engine.states['alice'].timestamp == random_timestamp
+        assert store.load_snapshot('bob') == {'1': 'approved'}
+
+        assert asyncio.run(engine.run_cycle()) == 0, (
+            'Check that accounts are not polled again before they are due.'
+        )
+        for state in engine.queue.pop_due(float('inf')):
+            engine.queue.push(0, state)
+        asyncio.run(engine.run_cycle())
+        assert len(bot.sent) == 2, (
+            'Check that a known status is not sent again.'
+        )
+
+    def test_stop_finishes_the_cycle_and_saves_cursors(self, mock_api,
+                                                       state_dir,
+                                                       random_timestamp):
+        store = StatusStore(str(state_dir / 'homework.db'))
+        (state_dir / 'cursors').mkdir()
+        engine = AsyncEngine(RecordingBot(), self.ACCOUNTS, store)
+
+        async def stop_soon():
+            task = asyncio.create_task(engine.run_forever())
+            await asyncio.sleep(0.2)
+            engine.stop()
+            await asyncio.wait_for(task, 5)
+
+        asyncio.run(stop_soon())
+        engine.checkpoint()
+        assert sorted(os.listdir(state_dir / 'cursors')) == [
+            'alice.txt', 'bob.txt', 'broken.txt'
+        ], 'Check that every cursor is saved when the engine stops.'
+        assert (state_dir / 'cursors' / 'alice.txt').read_text() == (
+            str(random_timestamp)
+        )
+
+
+class TestAccounts:
+
+    def test_load_accounts(self, state_dir):
+        path = state_dir / 'accounts.json'
+        path.write_text(json.dumps([
+            {'name': 'alice', 'practicum_token': 'token', 'chat_id': 1}
+        ]))
+        assert load_accounts(str(path)) == [Account('alice', 'token', '1')]
+
+    @pytest.mark.parametrize('data', [
+        [{'name': 'alice'}],
+        [{'name': '../alice', 'practicum_token': 'token', 'chat_id': 1}],
+        [{'name': 'alice', 'practicum_token': 'token', 'chat_id': 1},
+         {'name': 'alice', 'practicum_token': 'token', 'chat_id': 2}],
+    ])
+    def test_invalid_accounts(self, state_dir, data):
+        path = state_dir / 'accounts.json'
+        path.write_text(json.dumps(data))
+        with pytest.raises(ConfigException):
+            load_accounts(str(path))
+
+    def test_subscriptions_add_chats(self, state_dir):
+        path = state_dir / 'subscriptions.json'
+        path.write_text(json.dumps({'alice': [1, 7, '-100']}))
+        (alice,) = subscribe(
+            [Account('alice', 'token', '1')], load_subscriptions(str(path))
+        )
+        assert alice.chats == ('1', '7', '-100'), (
+            'Check that the own chat comes first and is not repeated.'
+        )
+        assert load_subscriptions(str(state_dir / 'missing.json')) == {}
+
+    @pytest.mark.parametrize('data', [
+        {'alice': '7'}, ['alice'], {'bob': [7]},
+    ])
+    def test_invalid_subscriptions(self, state_dir, data):
+        path = state_dir / 'subscriptions.json'
+        path.write_text(json.dumps(data))
+        with pytest.raises(ConfigException):
+            subscribe(
+                [Account('alice', 'token', '1')],
+                load_subscriptions(str(path))
+            )
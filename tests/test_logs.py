@@ -0,0 +1,27 @@
+import json
+import logging
+
+import logs
+
+
+class TestLogQueueHandler:
+
+    def test_records_are_written_by_the_listener(self, state_dir):
+        path = state_dir / 'main.log'
+        path.write_text('previous run\n', encoding='utf-8')
+        handler = logs.queue_handler(str(path), log_format='json')
+        logger = logging.getLogger('tests.logs')
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        try:
+            logger.info('Polling %s', 'alice')
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+        previous, line = path.read_text(encoding='utf-8').splitlines()
+        assert previous == 'previous run', (
+            'Check that the log file is appended to on start.'
+        )
+        record = json.loads(line)
+        assert record['message'] == 'Polling alice'
+        assert record['level'] == 'INFO'
@@ -0,0 +1,57 @@
+import urllib.request
+
+import pytest
+
+from metrics import Counter, Histogram, MetricsHandler, Registry, start_server
+
+
+@pytest.fixture
+def registry():
+    return Registry()
+
+
+class TestMetrics:
+
+    def test_exposition_format(self, registry):
+        responses = registry.register(
+            Counter('responses_total', 'Responses.', ('code',))
+        )
+        latency = registry.register(
+            Histogram('latency_seconds', 'Latency.', buckets=(0.1, 1))
+        )
+        responses.inc('200')
+        responses.inc('200')
+        responses.inc('a "quoted"\nvalue')
+        latency.observe(0.1)
+        latency.observe(0.5)
+        latency.observe(5)
+        assert registry.exposition().splitlines() == [
+            '# HELP responses_total Responses.',
+            '# TYPE responses_total counter',
+            'responses_total{code="200"} 2',
+            'responses_total{code="a \\"quoted\\"\\nvalue"} 1',
+            '# HELP latency_seconds Latency.',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{le="0.1"} 1',
+            'latency_seconds_bucket{le="1"} 2',
+            'latency_seconds_bucket{le="+Inf"} 3',
+            'latency_seconds_sum 5.6',
+            'latency_seconds_count 3',
+        ]
+
+    def test_endpoint_serves_the_registry(self, registry, monkeypatch):
+        registry.register(Counter('polls_total', 'Polls.')).inc()
+        monkeypatch.setattr(MetricsHandler, 'registry', registry)
+        server = start_server(port=0)
+        try:
+            host, port = server.server_address
+            with urllib.request.urlopen(
+                f'http://{host}:{port}/metrics', timeout=5
+            ) as response:
+                body = response.read().decode()
+                content_type = response.headers['Content-Type']
+        finally:
+            server.shutdown()
+            server.server_close()
+        assert content_type.startswith('text/plain; version=0.0.4')
+        assert 'polls_total 1' in body.splitlines()
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import homework
+import replay
+from recording import Recorder, load_recording
+
+DAY = 86400
+START = 1_700_000_000
+
+
+def answer(status, at):
+    return {
+        'homeworks': [{
+            'id': 1, 'homework_name': 'hw1', 'status': status,
+            'date_updated': str(at)
+        }],
+        'current_date': at
+    }
+
+
+@pytest.fixture
+def recording(state_dir):
+    path = state_dir / 'recording.jsonl'
+    recorder = Recorder(str(path))
+    for offset, status in ((0, 'reviewing'), (DAY, 'rejected'),
+                           (DAY + 3600, 'reviewing'), (2 * DAY, 'approved')):
+        recorder.record('alice', answer(status, START + offset),
+                        now=START + offset)
+    recorder.record('bob', answer('reviewing', START), now=START)
+    return path
+
+
+class TestReplay:
+
+    def test_recorder_writes_json_lines(self, recording):
+        lines = recording.read_text(encoding='utf-8').splitlines()
+        assert len(lines) == 5
+        assert json.loads(lines[0])['account'] == 'alice'
+
+    def test_days_of_polling_run_under_a_virtual_clock(self, recording):
+        timelines = load_recording(str(recording))
+        report = replay.replay(timelines, duration=3 * DAY)
+        assert report.simulated >= 3 * DAY
+        assert report.wall < 30
+        assert report.errors == 0
+        assert report.messages == 5, (
+            'Check that every status change is notified exactly once.'
+        )
+        assert report.requests == report.polls
+        assert report.not_modified > report.polls // 2, (
+            'Check that unchanged answers are revalidated with a 304.'
+        )
+        assert homework.time is replay.time, (
+            'Check that the real clock is restored after the replay.'
+        )
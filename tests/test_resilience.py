@@ -0,0 +1,123 @@
+import pytest
+import requests
+
+import exceptions
+import utils
+from resilience import CircuitBreaker, breaker_for, retry_delay
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestRetryDelay:
+
+    @pytest.mark.parametrize('failures, ceiling', [(1, 1), (3, 4), (10, 30)])
+    def test_backs_off_exponentially_up_to_the_cap(self, failures, ceiling):
+        delays = [retry_delay(failures, base=1, cap=30) for _ in range(50)]
+        assert all(0 <= delay <= ceiling for delay in delays)
+        assert len(set(delays)) > 1, 'Check that the delay is jittered.'
+
+
+class TestCircuitBreaker:
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker('api', threshold=3, reset=10,
+                                 clock=FakeClock())
+        for _ in range(2):
+            breaker.before_call()
+            breaker.failure()
+        breaker.success()
+        for _ in range(3):
+            breaker.before_call()
+            breaker.failure()
+        with pytest.raises(exceptions.CircuitOpenException):
+            breaker.before_call()
+
+    def test_half_open_lets_one_probe_through(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker('api', threshold=1, reset=10, clock=clock)
+        breaker.before_call()
+        breaker.failure()
+        clock.now = 10
+        breaker.before_call()
+        with pytest.raises(exceptions.CircuitOpenException):
+            breaker.before_call()
+        breaker.failure()
+        clock.now = 15
+        with pytest.raises(exceptions.CircuitOpenException):
+            breaker.before_call()
+        assert breaker.state == 'open', (
+            'Check that a failed probe opens the circuit again.'
+        )
+        clock.now = 20
+        breaker.before_call()
+        breaker.success()
+        breaker.before_call()
+        assert breaker.state == 'closed'
+
+
+class TestGetApiAnswer:
+
+    def test_fails_fast_while_the_api_is_down(self, monkeypatch,
+                                              random_timestamp,
+                                              homework_module):
+        calls = []
+
+        def mock_response_get(*args, **kwargs):
+            calls.append(args)
+            response = utils.MockResponseGET(
+                *args, random_timestamp=random_timestamp, **kwargs
+            )
+            response.status_code = 503
+            return response
+
+        monkeypatch.setattr(requests, 'get', mock_response_get)
+        breaker = breaker_for(homework_module.ENDPOINT)
+        for _ in range(breaker.threshold):
+            with pytest.raises(exceptions.TransientAPIException):
+                homework_module.get_api_answer(random_timestamp)
+        with pytest.raises(exceptions.CircuitOpenException):
+            homework_module.get_api_answer(random_timestamp)
+        assert len(calls) == breaker.threshold, (
+            'Check that no request is sent while the circuit is open.'
+        )
+
+    def test_client_errors_do_not_open_the_circuit(self, monkeypatch,
+                                                   random_timestamp,
+                                                   homework_module):
+        def mock_response_get(*args, **kwargs):
+            response = utils.MockResponseGET(
+                *args, random_timestamp=random_timestamp, **kwargs
+            )
+            response.status_code = 401
+            return response
+
+        monkeypatch.setattr(requests, 'get', mock_response_get)
+        for _ in range(10):
+            with pytest.raises(exceptions.GetAPIException) as error:
+                homework_module.get_api_answer(random_timestamp)
+            assert not isinstance(
+                error.value, exceptions.TransientAPIException
+            )
+        assert breaker_for(homework_module.ENDPOINT).state == 'closed'
+
+    def test_transient_failures_shorten_the_next_poll(self, monkeypatch,
+                                                      homework_module):
+        def mock_session_get(*args, **kwargs):
+            raise requests.ConnectionError('Connection refused')
+
+        monkeypatch.setattr(requests.Session, 'get', mock_session_get)
+        state = homework_module.load_state(
+            homework_module.Account('alice', 'token', '1'),
+            homework_module.StatusStore('homework.db'), 0
+        )
+        for failures in range(1, 4):
+            with pytest.raises(exceptions.TransientAPIException):
+                homework_module.poll_account(None, None, state)
+            assert state.failures == failures
+            assert homework_module.next_delay(state) <= 2 ** failures
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import AdaptiveScheduler, PollQueue
+
+
+class TestAdaptiveScheduler:
+
+    def test_backs_off_while_nothing_changes(self):
+        scheduler = AdaptiveScheduler(
+            600, min_interval=60, max_interval=3600, factor=2, jitter=0
+        )
+        scheduler.record(0)
+        assert scheduler.delay() == 1200
+        for _ in range(10):
+            scheduler.record(0)
+        assert scheduler.delay() == 3600, (
+            'Check that the interval never exceeds the maximum.'
+        )
+
+    def test_snaps_back_after_a_change(self):
+        scheduler = AdaptiveScheduler(
+            3600, min_interval=60, max_interval=3600, factor=2, jitter=0
+        )
+        scheduler.record(1)
+        assert scheduler.delay() == 60
+
+    @pytest.mark.parametrize('interval', [60, 600, 3600])
+    def test_jitter_stays_within_bounds(self, interval):
+        scheduler = AdaptiveScheduler(
+            interval, min_interval=60, max_interval=3600, jitter=0.5
+        )
+        delays = {scheduler.delay() for _ in range(50)}
+        assert all(60 <= delay <= 3600 for delay in delays)
+        assert len(delays) > 1, 'Check that the delay is jittered.'
+
+
+class TestPollQueue:
+
+    def test_pops_due_items_in_order(self):
+        queue = PollQueue()
+        queue.push(30, 'c')
+        queue.push(10, 'a')
+        queue.push(20, 'b')
+        assert queue.pop_due(20) == ['a', 'b']
+        assert queue.next_due() == 30
+        assert queue.pop_due(25) == []
+        assert len(queue) == 1
+
+    def test_push_wakes_the_waiter(self):
+        queue = PollQueue()
+        queue.push(time.monotonic() + 60, 'later')
+        timer = threading.Timer(0.05, queue.push, (0, 'retry'))
+        timer.start()
+        started = time.monotonic()
+        queue.wait(60)
+        timer.join()
+        assert time.monotonic() - started < 5, (
+            'Check that an item pushed while waiting wakes the waiter.'
+        )
+        assert queue.pop_due(time.monotonic()) == ['retry']
+
+    def test_wait_returns_when_the_first_item_is_due(self):
+        queue = PollQueue()
+        queue.push(time.monotonic() - 1, 'due')
+        started = time.monotonic()
+        queue.wait(60)
+        assert time.monotonic() - started < 1
@@ -0,0 +1,226 @@
+import threading
+import time
+
+import pytest
+import telegram
+
+import sender as sender_module
+from sender import MessageSender, TokenBucket, batch_messages, fit_message
+from storage import Outbox
+
+
+@pytest.fixture
+def outbox(state_dir):
+    return Outbox(str(state_dir / 'homework.db'))
+
+
+class RecordingBot:
+    def __init__(self, retry_after=None, offline=False, broken=False,
+                 migrate_to=None):
+        self.sent = []
+        self.migrate_to = migrate_to
+        self.retry_after = retry_after
+        self.offline = offline
+        self.broken = broken
+
+    def send_message(self, chat_id=None, text=None, **kwargs):
+        if self.migrate_to is not None and chat_id != self.migrate_to:
+            raise telegram.error.ChatMigrated(self.migrate_to)
+        if self.broken:
+            self.broken = False
+            raise ValueError('Unexpected failure')
+        if self.offline:
+            raise telegram.error.NetworkError('Telegram is unreachable')
+        if self.retry_after is not None:
+            retry_after, self.retry_after = self.retry_after, None
+            raise telegram.error.RetryAfter(retry_after)
+        self.sent.append((chat_id, text))
+
+
+class TestTokenBucket:
+
+    def test_bucket_limits_rate(self):
+        bucket = TokenBucket(rate=2, capacity=1)
+        now = bucket.updated
+        assert bucket.delay(now) == 0
+        bucket.consume(now)
+        assert bucket.delay(now) == pytest.approx(0.5)
+        assert bucket.delay(now + 0.5) == 0
+
+
+class TestMessageSender:
+
+    def test_messages_are_delivered_in_order(self, outbox):
+        bot = RecordingBot()
+        sender = MessageSender(
+            bot, outbox, global_rate=100, chat_rate=100, window=0
+        ).start()
+        for number in range(3):
+            sender.send_message('1', f'message {number}')
+        sender.stop(timeout=5)
+        assert bot.sent == [('1', f'message {n}') for n in range(3)]
+        assert outbox.pending(10) == []
+
+    def test_slow_chat_does_not_block_others(self, outbox):
+        bot = RecordingBot()
+        sender = MessageSender(
+            bot, outbox, global_rate=100, chat_rate=2, window=0
+        ).start()
+        sender.send_message('1', 'first')
+        sender.send_message('1', 'second')
+        sender.send_message('2', 'other')
+        sender.stop(timeout=5)
+        assert bot.sent == [('1', 'first'), ('2', 'other'), ('1', 'second')], (
+            'Check that a message postponed by the per-chat limit does not '
+            'hold up messages for other chats.'
+        )
+
+    def test_blocked_chats_do_not_delay_or_fail_others(self, outbox):
+        release = threading.Event()
+        bot = RecordingBot()
+        send = bot.send_message
+
+        def send_message(chat_id=None, text=None, **kwargs):
+            if chat_id == 'slow':
+                release.wait(5)
+            if chat_id == 'deleted':
+                raise telegram.error.Unauthorized('bot was blocked')
+            send(chat_id, text)
+
+        bot.send_message = send_message
+        sender = MessageSender(
+            bot, outbox, global_rate=100, chat_rate=100, workers=4
+        ).start()
+        for chat_id in ('slow', 'deleted', '1', '2'):
+            sender.send_message(chat_id, 'status')
+        deadline = time.monotonic() + 5
+        while len(bot.sent) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert sorted(bot.sent) == [('1', 'status'), ('2', 'status')], (
+            'Check that a slow chat does not hold up the other chats.'
+        )
+        release.set()
+        sender.stop(timeout=5)
+        outcomes = outbox.outcomes()
+        assert outcomes['deleted'][0] == 'dropped'
+        assert {outcomes[chat][0] for chat in ('slow', '1', '2')} == {
+            'delivered'
+        }, 'Check that the outcome of every chat is recorded.'
+
+    def test_messages_within_the_window_are_merged(self, outbox):
+        bot = RecordingBot()
+        sender = MessageSender(
+            bot, outbox, global_rate=100, chat_rate=100, window=0.2
+        ).start()
+        sender.send_message('1', 'reviewing')
+        sender.send_message('2', 'other')
+        sender.send_message('1', 'rejected')
+        deadline = time.monotonic() + 5
+        while len(bot.sent) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        sender.send_message('1', 'approved')
+        sender.stop(timeout=5)
+        assert bot.sent == [
+            ('1', 'reviewing\n\nrejected'), ('2', 'other'), ('1', 'approved')
+        ], (
+            'Check that the messages of a chat queued within the flush '
+            'window go out as one message.'
+        )
+        assert outbox.pending(10) == []
+
+    def test_retry_after_is_honoured(self, monkeypatch, outbox):
+        sleeps = []
+        monkeypatch.setattr(time, 'sleep', sleeps.append)
+        bot = RecordingBot(retry_after=3)
+        sender = MessageSender(bot, outbox, global_rate=100, chat_rate=100)
+        sender.deliver((), '1', 'text')
+        assert sleeps == [3]
+        assert bot.sent == [('1', 'text')]
+
+    def test_full_queue_keeps_message_in_outbox(self, monkeypatch, outbox):
+        monkeypatch.setattr(sender_module, 'SEND_QUEUE_TIMEOUT', 0)
+        sender = MessageSender(RecordingBot(), outbox, maxsize=1)
+        sender.send_message('1', 'first')
+        sender.send_message('1', 'second')
+        assert [row[2] for row in outbox.pending(10)] == ['first', 'second']
+        assert sender.stranded, (
+            'Check that a message that does not fit in the queue is left '
+            'in the outbox for a replay.'
+        )
+
+    def test_unexpected_error_keeps_worker_alive(self, monkeypatch, outbox):
+        monkeypatch.setattr(sender_module, 'REPLAY_INTERVAL', 0)
+        bot = RecordingBot(broken=True)
+        sender = MessageSender(
+            bot, outbox, global_rate=100, chat_rate=100
+        ).start()
+        sender.send_message('1', 'first')
+        deadline = time.monotonic() + 5
+        while not bot.sent and time.monotonic() < deadline:
+            time.sleep(0.05)
+        sender.send_message('1', 'second')
+        sender.stop(timeout=5)
+        assert bot.sent == [('1', 'first'), ('1', 'second')], (
+            'Check that an unexpected error does not kill the sender and '
+            'the failed message is replayed from the outbox.'
+        )
+
+
+class TestOutbox:
+
+    def test_failed_messages_are_replayed_in_batches(self, outbox,
+                                                     monkeypatch):
+        monkeypatch.setattr(sender_module, 'REPLAY_INTERVAL', 0)
+        bot = RecordingBot(offline=True)
+        sender = MessageSender(bot, outbox, global_rate=100, chat_rate=100)
+        sender.send_message('1', 'first', key='hw:1:reviewing')
+        sender.send_message('1', 'second', key='hw:1:approved')
+        sender.send_message('1', 'second', key='hw:1:approved')
+        sender.stopped.set()
+        sender.run()
+        assert len(outbox.pending(10)) == 2, (
+            'Check that undelivered messages stay in the outbox and that '
+            'a message already pending is not stored twice.'
+        )
+
+        bot.offline = False
+        sender = MessageSender(
+            bot, outbox, global_rate=100, chat_rate=100
+        ).start()
+        sender.stop(timeout=5)
+        assert bot.sent == [('1', 'first\n\nsecond')], (
+            'Check that pending messages for one chat are replayed as '
+            'a single batch.'
+        )
+        assert outbox.pending(10) == []
+
+    def test_batch_messages_respects_length_limit(self):
+        rows = [(1, '1', 'a' * 6), (2, '2', 'b'), (3, '1', 'c' * 6)]
+        assert batch_messages(rows, limit=10) == [
+            ([1], '1', 'a' * 6), ([3], '1', 'c' * 6), ([2], '2', 'b')
+        ]
+
+    def test_oversize_text_is_truncated(self):
+        rows = [(1, '1', 'a' * 20)]
+        ((ids, chat_id, text),) = batch_messages(rows, limit=10)
+        assert len(text) == 10 and text == fit_message('a' * 20, 10)
+
+    def test_flapping_statuses_are_all_kept(self, outbox):
+        sender = MessageSender(RecordingBot(), outbox)
+        sender.send_message('1', 'rejected', key='a:1:rejected:t1')
+        sender.send_message('1', 'reviewing', key='a:1:reviewing:t2')
+        sender.send_message('1', 'rejected', key='a:1:rejected:t3')
+        assert [row[2] for row in outbox.pending(10)] == [
+            'rejected', 'reviewing', 'rejected'
+        ], (
+            'Check that a repeated status of the same homework is not '
+            'mistaken for an already pending message.'
+        )
+
+    def test_migrated_chat_is_resent(self, outbox):
+        bot = RecordingBot(migrate_to=-100)
+        sender = MessageSender(bot, outbox)
+        message_id = outbox.add('key', '1', 'text')
+        sender.deliver((message_id,), '1', 'text')
+        assert bot.sent == [(-100, 'text')]
+        assert outbox.pending(10) == []
@@ -0,0 +1,143 @@
+import asyncio
+
+import pytest
+import requests
+
+import utils
+from accounts import Account
+from engine import AsyncEngine
+from exceptions import ConfigException
+from sharding import HashRing, shard_accounts, shard_name
+from storage import LeaseStore, Outbox, StatusStore
+
+ACCOUNTS = [Account(f'student{number}', 'token', '1') for number in range(500)]
+
+
+class TestHashRing:
+
+    def test_shards_split_the_accounts(self):
+        shards = [shard_accounts(ACCOUNTS, index, 4) for index in range(4)]
+        names = [account.name for shard in shards for account in shard]
+        assert sorted(names) == sorted(account.name for account in ACCOUNTS)
+        assert all(60 < len(shard) < 190 for shard in shards), (
+            'Check that the accounts are spread evenly over the shards.'
+        )
+
+    def test_adding_a_shard_moves_few_accounts(self):
+        before, after = HashRing(range(4)), HashRing(range(5))
+        moved = [
+            account for account in ACCOUNTS
+            if before.owner(account.name) != after.owner(account.name)
+        ]
+        assert all(after.owner(account.name) == 4 for account in moved), (
+            'Check that accounts only move to the new shard.'
+        )
+        assert len(moved) < len(ACCOUNTS) * 0.35
+
+    @pytest.mark.parametrize('index, count', [(2, 2), (-1, 2), (0, 0)])
+    def test_invalid_shard(self, index, count):
+        with pytest.raises(ConfigException):
+            shard_accounts(ACCOUNTS, index, count)
+
+
+class TestLeases:
+
+    def test_lease_is_held_until_it_expires(self, state_dir):
+        path = str(state_dir / 'homework.db')
+        first, second = LeaseStore(path, 'shard-0'), LeaseStore(path, 'shard-1')
+        assert first.claim('alice', 60)
+        assert first.claim('alice', 60), 'Check that a lease can be renewed.'
+        assert not second.claim('alice', 60)
+        assert first.claim('bob', -1)
+        assert second.claim('bob', 60), (
+            'Check that an expired lease can be taken over.'
+        )
+        first.release()
+        assert second.claim('alice', 60)
+
+    def test_outbox_rows_of_a_live_owner_are_not_replayed(self, state_dir):
+        path = str(state_dir / 'homework.db')
+        leases = LeaseStore(path, 'shard-0')
+        mine, theirs = Outbox(path, 'shard-1'), Outbox(path, 'shard-0')
+        leases.claim('alice', 60)
+        theirs.add('key', '1', 'text')
+        assert mine.pending(10) == []
+        leases.release()
+        LeaseStore(path, 'shard-1').heartbeat(60)
+        assert [row[2] for row in mine.pending(10)] == ['text'], (
+            'Check that messages of a stopped worker are adopted.'
+        )
+        assert theirs.pending(10) == [], (
+            'Check that a live worker without accounts keeps its messages.'
+        )
+
+    def test_processes_of_one_shard_do_not_share_leases(self, state_dir):
+        path = str(state_dir / 'homework.db')
+        old = LeaseStore(path, shard_name(0))
+        new = LeaseStore(path, shard_name(0))
+        assert old.owner != new.owner
+        old.heartbeat(60)
+        assert old.claim('alice', 60)
+        assert not new.claim('alice', 60), (
+            'Check that a new process of the shard waits for the old one.'
+        )
+        assert new.claim('bob', 60)
+        Outbox(path, old.owner).add('key', '1', 'text')
+        outbox = Outbox(path, new.owner)
+        assert outbox.pending(10) == []
+        old.release()
+        assert not LeaseStore(path, shard_name(1)).claim('bob', 60), (
+            'Check that releasing the old process keeps the new leases.'
+        )
+        assert new.claim('alice', 60)
+        assert [row[2] for row in outbox.pending(10)] == ['text']
+
+
+class TestShardedEngine:
+
+    def test_account_is_polled_by_one_worker(self, monkeypatch, state_dir,
+                                             random_timestamp):
+        def mock_session_get(session, *args, **kwargs):
+            response = utils.MockResponseGET(
+                *args, random_timestamp=random_timestamp, **kwargs
+            )
+            response.json = lambda: {
+                'homeworks': [
+                    {'id': 1, 'homework_name': 'hw', 'status': 'approved'}
+                ],
+                'current_date': random_timestamp
+            }
+            return response
+
+        class Bot:
+            sent = []
+
+            def send_message(self, chat_id=None, text=None, **kwargs):
+                self.sent.append(chat_id)
+
+        monkeypatch.setattr(requests.Session, 'get', mock_session_get)
+        (state_dir / 'cursors').mkdir()
+        path = str(state_dir / 'homework.db')
+        accounts = [Account('alice', 'token', '1')]
+        engines = [
+            AsyncEngine(
+                Bot(), accounts, StatusStore(path),
+                leases=LeaseStore(path, f'shard-{index}')
+            )
+            for index in range(2)
+        ]
+        for engine in engines:
+            asyncio.run(engine.run_cycle())
+        assert Bot.sent == ['1'], (
+            'Check that an account leased by one worker is not polled and '
+            'notified by another.'
+        )
+        engines[0].leases.release()
+        for state in engines[1].queue.pop_due(float('inf')):
+            engines[1].queue.push(0, state)
+        asyncio.run(engines[1].run_cycle())
+        assert Bot.sent == ['1'], (
+            'Check that a worker taking a lease over reloads the notified '
+            'statuses instead of repeating them.'
+        )
+        assert engines[1].held == {'alice'}
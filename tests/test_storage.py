@@ -0,0 +1,24 @@
+from storage import StatusStore
+
+
+class TestStatusStore:
+
+    def test_unknown_account_has_empty_snapshot(self, state_dir):
+        store = StatusStore(str(state_dir / 'homework.db'))
+        assert store.load_snapshot('default') == {}
+
+    def test_status_survives_restart(self, state_dir):
+        path = str(state_dir / 'homework.db')
+        store = StatusStore(path)
+        store.set_status('default', 123, 'reviewing')
+        store.set_status('default', 123, 'approved', '2020-02-13T14:40:57Z')
+        store.set_status('other', 123, 'rejected')
+        store.close()
+
+        store = StatusStore(path)
+        assert store.load_snapshot('default') == {'123': 'approved'}, (
+            'Check that the last saved status is read back after a restart.'
+        )
+        assert store.load_snapshot('other') == {'123': 'rejected'}, (
+            'Check that statuses are kept separately for each account.'
+        )
@@ -0,0 +1,72 @@
+import os
+import signal
+import sys
+import time
+
+from supervisor import Supervisor, worker_log_file
+
+
+def crash(index, count):
+    sys.exit(1)
+
+
+def drain(index, count):
+    def stop(signum, frame):
+        with open(f'stopped-{index}', 'w') as file:
+            file.write('drained')
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    while True:
+        time.sleep(0.01)
+
+
+def hang(index, count):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    while True:
+        time.sleep(0.01)
+
+
+def watch(supervisor, seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        supervisor.check(time.monotonic())
+        time.sleep(0.01)
+
+
+class TestSupervisor:
+
+    def test_crashed_workers_are_restarted_with_backoff(self):
+        supervisor = Supervisor(
+            count=2, target=crash, base_delay=0.05, max_delay=0.2
+        )
+        for worker in supervisor.workers:
+            supervisor.spawn(worker)
+        watch(supervisor, 1)
+        supervisor.shutdown(timeout=1)
+        for worker in supervisor.workers:
+            assert 2 < worker.failures < 40, (
+                'Check that a crashing worker is restarted with a growing '
+                'delay.'
+            )
+
+    def test_sigterm_lets_workers_drain(self, state_dir):
+        supervisor = Supervisor(count=2, target=drain)
+        for worker in supervisor.workers:
+            supervisor.spawn(worker)
+        time.sleep(0.2)
+        supervisor.shutdown(timeout=5)
+        assert sorted(os.listdir(state_dir)) == ['stopped-0', 'stopped-1']
+        assert [w.process.exitcode for w in supervisor.workers] == [0, 0]
+
+    def test_workers_that_hang_are_killed(self):
+        supervisor = Supervisor(count=1, target=hang)
+        supervisor.spawn(supervisor.workers[0])
+        time.sleep(0.2)
+        started = time.monotonic()
+        supervisor.shutdown(timeout=0.3)
+        assert time.monotonic() - started < 3
+        assert supervisor.workers[0].process.exitcode == -signal.SIGKILL
+
+    def test_worker_log_files(self):
+        assert worker_log_file(3, 'logs/main.log') == 'logs/main-3.log'
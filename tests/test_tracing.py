@@ -0,0 +1,45 @@
+import os
+import signal
+
+import pytest
+
+from tracing import STAGES, Tracer, install_dump_handler
+
+
+class TestTracer:
+
+    def test_ring_buffer_keeps_recent_cycles(self):
+        tracer = Tracer(size=2)
+        for name in ('first', 'second', 'third'):
+            with tracer.cycle(name) as trace:
+                with trace.span('fetch'):
+                    pass
+        assert [trace.name for trace in tracer.traces] == ['second', 'third']
+        assert set(tracer.traces[0].stages) == set(STAGES)
+
+    def test_report_lists_slowest_cycles_first(self):
+        tracer = Tracer()
+        for name, seconds in (('fast', 0.1), ('slow', 2.0), ('medium', 1.0)):
+            with tracer.cycle(name) as trace:
+                trace.stages['send'] = seconds
+            trace.total = seconds
+        lines = tracer.report(count=2).splitlines()
+        assert [line.split()[1] for line in lines[2:]] == ['slow', 'medium']
+        assert lines[2].split()[-1] == '2000.0', (
+            'Check that the report breaks the cycle down by stage.'
+        )
+
+    @pytest.mark.skipif(
+        not hasattr(signal, 'SIGUSR1'), reason='SIGUSR1 is not available'
+    )
+    def test_sigusr1_dumps_the_report(self, caplog):
+        tracer = Tracer()
+        with tracer.cycle('alice'):
+            pass
+        previous = signal.getsignal(signal.SIGUSR1)
+        install_dump_handler(tracer)
+        try:
+            os.kill(os.getpid(), signal.SIGUSR1)
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+        assert any('alice' in record.message for record in caplog.records)
@@ -0,0 +1,60 @@
+import sys
+
+import pytest
+
+import exceptions
+from records import Homework, StatusCodes
+from validator import HOMEWORK_SCHEMA, Validator
+
+
+CODES = StatusCodes(('approved', 'reviewing'))
+
+
+@pytest.fixture
+def validator():
+    return Validator(
+        HOMEWORK_SCHEMA, choices={'status': CODES.statuses},
+        record=lambda item: Homework.from_dict(item, CODES)
+    )
+
+
+class TestValidator:
+
+    def test_malformed_homework_does_not_abort_batch(self, validator):
+        items = [
+            {'id': 1, 'homework_name': 'hw1', 'status': 'approved'},
+            {'id': 2, 'status': 'approved'},
+            {'id': 3, 'homework_name': 'hw3', 'status': 'unknown'},
+            'not a homework',
+            {'homework_name': 'hw5', 'status': 'reviewing',
+             'date_updated': '2020-02-13T14:40:57Z'},
+        ]
+        records, errors = validator.validate(items)
+        assert records == [
+            Homework('1', 'hw1', 0, 'approved'),
+            Homework('hw5', 'hw5', 1, 'reviewing', '2020-02-13T14:40:57Z'),
+        ], 'Check that every valid homework is returned as a record.'
+        assert [(index, type(error)) for index, error in errors] == [
+            (1, KeyError),
+            (2, exceptions.StatusException),
+            (3, TypeError),
+        ], 'Check that each malformed homework gets its own error.'
+
+    def test_parse_raises_first_problem(self, validator):
+        with pytest.raises(TypeError):
+            validator.parse({'homework_name': 1, 'status': 'approved'})
+
+
+class TestHomeworkRecord:
+
+    def test_records_share_status_strings(self):
+        status = ''.join(['appro', 'ved'])
+        assert status is not sys.intern('approved')
+        record = Homework.from_dict(
+            {'id': 1, 'homework_name': 'hw', 'status': status}, CODES
+        )
+        assert record.code == 0
+        assert record.status is CODES.status(0), (
+            'Check that records keep the shared copy of the status.'
+        )
+        assert not hasattr(record, '__dict__')
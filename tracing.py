@@ -0,0 +1,93 @@
+import heapq
+import logging
+import os
+import signal
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+TRACE_SIZE = int(os.getenv('TRACE_SIZE', 512))
+TRACE_REPORT = int(os.getenv('TRACE_REPORT', 10))
+STAGES = ('fetch', 'validate', 'parse', 'diff', 'send')
+
+
+class Trace:
+    """Monotonic stage timings of one polling cycle."""
+
+    __slots__ = ('name', 'wall', 'started', 'total', 'stages')
+
+    def __init__(self, name):
+        self.name = name
+        self.wall = time.time()
+        self.started = time.monotonic()
+        self.total = 0.0
+        self.stages = dict.fromkeys(STAGES, 0.0)
+
+    @contextmanager
+    def span(self, stage):
+        """Adds the time the block takes to the stage."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stages[stage] += time.monotonic() - started
+
+
+class Tracer:
+    """Ring buffer of the most recent polling cycles."""
+
+    def __init__(self, size=TRACE_SIZE):
+        self.traces = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def cycle(self, name):
+        """Yields the trace of a cycle and keeps it once the cycle ends."""
+        trace = Trace(name)
+        try:
+            yield trace
+        finally:
+            trace.total = time.monotonic() - trace.started
+            with self.lock:
+                self.traces.append(trace)
+
+    def slowest(self, count=TRACE_REPORT):
+        """Returns the slowest of the recent cycles."""
+        with self.lock:
+            traces = list(self.traces)
+        return heapq.nlargest(count, traces, key=lambda trace: trace.total)
+
+    def report(self, count=TRACE_REPORT):
+        """Returns the slowest recent cycles broken down by stage."""
+        with self.lock:
+            recent = len(self.traces)
+        lines = [
+            f'Slowest cycles of the last {recent}, ms',
+            ' '.join(
+                [f'{"started":>8} {"account":<20} {"total":>9}']
+                + [f'{stage:>9}' for stage in STAGES]
+            ),
+        ]
+        for trace in self.slowest(count):
+            lines.append(' '.join(
+                [
+                    f'{time.strftime("%H:%M:%S", time.localtime(trace.wall))}'
+                    f' {trace.name[:20]:<20} {trace.total * 1000:9.1f}'
+                ]
+                + [f'{trace.stages[stage] * 1000:9.1f}' for stage in STAGES]
+            ))
+        return '\n'.join(lines)
+
+
+TRACER = Tracer()
+
+
+def install_dump_handler(tracer=TRACER):
+    """Logs the slowest recent cycles when the process gets SIGUSR1."""
+    if not hasattr(signal, 'SIGUSR1'):
+        return
+    signal.signal(
+        signal.SIGUSR1, lambda signum, frame: logging.warning(tracer.report())
+    )
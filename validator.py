@@ -0,0 +1,78 @@
+import exceptions
+
+
+RESPONSE_SCHEMA = {
+    'homeworks': (list, True),
+    'current_date': (int, False),
+}
+HOMEWORK_SCHEMA = {
+    'id': (int, False),
+    'homework_name': (str, True),
+    'status': (str, True),
+    'date_updated': (str, False),
+}
+
+
+class Validator:
+    """Validator compiled once from a declarative schema.
+
+    The schema maps each key to its type and whether it is required;
+    choices restrict the values a key may take. The schema is compiled
+    into a flat tuple of rules with prebuilt error messages, so checking
+    an item is a single pass over its keys.
+    """
+
+    def __init__(self, schema, choices=None, record=None):
+        choices = choices or {}
+        self.rules = tuple(
+            (
+                key, type_, required,
+                frozenset(choices[key]) if key in choices else None,
+                f'Missing "{key}" key in API response',
+                f'The "{key}" key is not a {type_.__name__}',
+            )
+            for key, (type_, required) in schema.items()
+        )
+        self.record = record
+
+    def check(self, item):
+        """Returns the first problem with the item or None."""
+        if not isinstance(item, dict):
+            return TypeError(
+                f'Expected a dictionary, got {type(item).__name__}'
+            )
+        for key, type_, required, allowed, missing, mistyped in self.rules:
+            value = item.get(key)
+            if value is None:
+                if required:
+                    return KeyError(missing)
+                continue
+            if not isinstance(value, type_):
+                return TypeError(mistyped)
+            if allowed is not None and value not in allowed:
+                return exceptions.StatusException(f'Unknown {key}: {value}')
+        return None
+
+    def parse(self, item):
+        """Returns the record of the item or raises its first problem."""
+        error = self.check(item)
+        if error is not None:
+            raise error
+        return item if self.record is None else self.record(item)
+
+    def validate(self, items):
+        """Validates the items in one pass.
+
+        Returns the records of the valid items and (index, error) pairs
+        for the others, so a malformed item does not reject the batch.
+        """
+        records, errors = [], []
+        for index, item in enumerate(items):
+            error = self.check(item)
+            if error is not None:
+                errors.append((index, error))
+            elif self.record is None:
+                records.append(item)
+            else:
+                records.append(self.record(item))
+        return records, errors